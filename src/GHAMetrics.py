@@ -7,57 +7,50 @@ import math
 import logging
 import base64
 import re
-from collections import OrderedDict
 import argparse
 import json
 import shutil
+from urllib.parse import quote
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
-from log_parser import parse_test_results , identify_test_frameworks_and_count_dependencies , identify_build_language , get_github_actions_log
+from log_parser import (identify_test_frameworks_and_count_dependencies, identify_build_language,
+                        get_github_actions_log, configure_log_spooling, add_test_results)
+from log_parsing import get_log_parsing_executor, configure_log_parsing, LOG_PARSING_MODES
 from patterns import framework_regex
-from commit_history_analyzer import get_commit_data_local, clone_repo_locally
+from commit_history_analyzer import (get_commit_data_local, clone_repo_locally, CommitHistoryIndex, CommitAnalysisPool,
+                                     classifier_version, check_git_version)
+from commit_store import get_commit_store, PersistentCommitCache
+from metrics_cache import get_metrics_cache, configure_metrics_cache
+from git_object_reader import close_object_reader
 from repo_info_collector import get_repository_languages , get_workflow_ids , count_lines_in_workflow_yml , get_workflow_all_ids
-from metrics_aggregator import save_builds_to_file , save_head
+from metrics_aggregator import (save_head, merge_output_shard, get_build_id_index, CsvBuildWriter, open_build_writer,
+                                OUTPUT_FORMATS)
 from build_run_analyzer import get_jobs_for_run , get_builds_info_from_build_yml , calculate_description_complexity
-from request_github import get_request
+from request_github import get_request, get_client, configure_client
+from rate_limit import TokenPool, load_tokens
+from build_pipeline import BuildPipeline, Stage
+from crawl_state import RepoCrawlState
+from async_request_github import (run_blocking, gather_requests, configure_concurrency,
+                                  async_count_lines_in_workflow_yml)
 import numpy as np
 
 
 import zipfile
 import io
+import asyncio
 
 github_token = 'your_token_here'  
 output_csv = 'builds_features.csv'
+output_format = 'csv'
+output_path = output_csv  # CSV file, Parquet dataset directory or SQLite database
+pipeline_settings = {'api_workers': 4, 'download_workers': 4, 'parse_workers': 2, 'queue_size': 16, 'commit_workers': 1}
 from_date = None
 to_date = None
+crawl_state_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".crawl_state")
+incremental = False
+commit_store_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".commit_metrics.db")
 
 
-class LRUCache:
-    def __init__(self, capacity: int):
-        self.cache = OrderedDict()
-        self.capacity = capacity
-
-    def get(self, key):
-        if key not in self.cache:
-            return None
-        else:
-            # Move accessed key to the end to show it was recently used
-            self.cache.move_to_end(key)
-            return self.cache[key]
-
-    def put(self, key, value):
-        if key in self.cache:
-            # Move the existing key to the end to mark it as recently used
-            self.cache.move_to_end(key)
-        elif len(self.cache) >= self.capacity:
-            # Remove the first item (least recently used)
-            self.cache.popitem(last=False)
-        self.cache[key] = value
-
-    def delete(self, key):
-        # Add this method to allow deletion of specific keys
-        if key in self.cache:
-            del self.cache[key]
-
 # Setup logging to both file and console
 logging.basicConfig(filename='app.log6', level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 console = logging.StreamHandler()
@@ -82,16 +75,24 @@ def fetch_file_content(repo_full_name, path, commit_sha, token):
         return None  # Skip if path is empty
 
     url = f"https://api.github.com/repos/{repo_full_name}/contents/{path}?ref={commit_sha}"
-    headers = {'Authorization': f'token {token}'}
-    
+
+    cache_key = (repo_full_name, path, commit_sha)
+    content = get_metrics_cache().get('file_content', cache_key)
+    if content is not None:
+        return content
+
     try:
-        response = requests.get(url, headers=headers)
+        response = get_client().request(url, token)
 
-        if response.status_code == 200:
+        if response is None:
+            return None  # Return None for network-related issues
+        elif response.status_code == 200:
             file_data = response.json()
             if 'content' in file_data:
                 try:
-                    return base64.b64decode(file_data['content']).decode('utf-8')
+                    content = base64.b64decode(file_data['content']).decode('utf-8')
+                    get_metrics_cache().put('file_content', cache_key, content)  # Pinned to a commit, never stale
+                    return content
                 except UnicodeDecodeError:
                     return None  # Return None if file is binary
             else:
@@ -111,26 +112,23 @@ import logging
 from datetime import datetime, timedelta, timezone
 import requests
 
-def get_team_size_last_three_months(repo_full_name, token, commit_cache):
+def get_team_size_last_three_months(repo_full_name, token, cache):
     """
     Efficiently fetches the number of unique contributors in the last three months.
-    Uses cached commit data if available, otherwise fetches from GitHub with rate limits in mind.
+    Uses the committers cached in the repository's "team/" namespace of the MetricsCache
+    if available, otherwise fetches from GitHub with rate limits in mind.
     """
     last_commit_url = f"https://api.github.com/repos/{repo_full_name}/commits"
     committers = set()
+    namespace = f"team/{repo_full_name}"
 
     # Check cached commits before making API requests
-    cached_commits = [commit for commit in commit_cache.cache.keys() if commit.startswith(repo_full_name)]
-    
+    cached_commits = cache.items(namespace)
+
     if cached_commits:
         logging.info(f"Using cached commits for {repo_full_name}")
-        for commit_sha in cached_commits:
-            commit_data = commit_cache.get(commit_sha)
-            if commit_data:
-                committers.add(commit_data.get('author', ''))  # Ensure author login is stored
-
-        if len(committers) > 0:
-            return len(committers)  # Return cached team size if data is available
+        committers.update(author for _, author in cached_commits)
+        return len(committers)  # Return cached team size if data is available
 
     logging.info(f"Fetching commits for {repo_full_name} from GitHub as cache is incomplete.")
 
@@ -146,56 +144,25 @@ def get_team_size_last_three_months(repo_full_name, token, commit_cache):
     # API request to fetch commits within the last 3 months
     commits_url = f"{last_commit_url}?since={start_date.isoformat()}Z&until={last_commit_date.isoformat()}Z"
 
-    attempt = 0  # Retry counter
-
     while commits_url:
-        try:
-            raw_response = requests.get(commits_url, headers={'Authorization': f'token {token}'})
-
-            if raw_response.status_code == 200:
-                response = raw_response.json()  # Convert to JSON list of commits
-
-                for commit in response:
-                    if commit.get('committer') and commit['committer'].get('login'):
-                        committers.add(commit['committer']['login'])
-                        commit_sha = commit.get('sha')
-                        if commit_sha:
-                            commit_cache.put(f"{repo_full_name}-{commit_sha}", {"author": commit['committer']['login']})
-
-                # Extract the next page URL from headers
-                link_header = raw_response.headers.get('Link', '')
-                commits_url = None  # Default to None, if no pagination exists
-                if link_header:
-                    links = {rel.split(";")[1].strip(): rel.split(";")[0].strip("<>") for rel in link_header.split(",")}
-                    if 'rel="next"' in links:
-                        commits_url = links['rel="next"']
-
-                attempt = 0  # Reset attempt counter after a successful request
-
-            elif raw_response.status_code == 403 and 'X-RateLimit-Reset' in raw_response.headers:
-                # Handle GitHub rate limits
-                reset_time = datetime.fromtimestamp(int(raw_response.headers['X-RateLimit-Reset']), timezone.utc)
-                sleep_time = (reset_time - datetime.now(timezone.utc)).total_seconds() + 10
-                logging.warning(f"Rate limit exceeded, sleeping for {sleep_time:.2f} seconds before retrying.")
-                time.sleep(sleep_time)
+        raw_response = get_client().request(commits_url, token)
 
-            else:
-                logging.error(f"Failed to fetch commits, status code: {raw_response.status_code}")
-                attempt += 1
-                time.sleep(min(2 ** attempt, 60))  # Exponential backoff (max 60s)
+        if raw_response is None or raw_response.status_code != 200:
+            status = raw_response.status_code if raw_response is not None else 'no response'
+            logging.error(f"Failed to fetch commits, status code: {status}")
+            break
 
-                if attempt > 5:  # Maximum retries
-                    logging.error("Max retries reached, aborting commit fetch.")
-                    break
+        response = raw_response.json()  # Convert to JSON list of commits
 
-        except requests.RequestException as e:
-            logging.error(f"Error fetching commits: {e}")
-            attempt += 1
-            time.sleep(min(2 ** attempt, 60))  # Exponential backoff (max 60s)
+        for commit in response:
+            if commit.get('committer') and commit['committer'].get('login'):
+                committers.add(commit['committer']['login'])
+                commit_sha = commit.get('sha')
+                if commit_sha:
+                    cache.put(namespace, commit_sha, commit['committer']['login'])
 
-            if attempt > 5:
-                logging.error("Max retries reached due to request errors, aborting commit fetch.")
-                break
+        # Follow the pagination links, if any
+        commits_url = raw_response.links.get('next', {}).get('url')
 
     return len(committers)
 
@@ -207,29 +174,39 @@ def get_team_size_last_three_months(repo_full_name, token, commit_cache):
 
 def fetch_pull_request_details(repo_full_name, commit_sha, token):
     """Fetch pull request details including PR number and merge commit SHA."""
+    # Runs of several workflows (and re-runs) share their head commit
+    cache_key = (repo_full_name, commit_sha)
+    pr_details = get_metrics_cache().get('pull_request', cache_key)
+    if pr_details is not None:
+        return dict(pr_details)
+
     # Get PRs that contain this commit
     pr_search_url = f"https://api.github.com/repos/{repo_full_name}/commits/{commit_sha}/pulls"
     pr_response = get_request(pr_search_url, token)
 
-    if pr_response:
-        if isinstance(pr_response, list) and len(pr_response) > 0:
-            # Take the first PR found (usually the correct one)
-            pr_info = pr_response[0]
-            return {
-                'gh_pull_req_number': pr_info.get('number', 0),
-                'gh_is_pr': True,
-                'gh_num_pr_comments': pr_info.get('comments', 0),
-                'git_merged_with': pr_info.get('merge_commit_sha', None),
-                'gh_description_complexity': calculate_description_complexity(pr_info),
-            }
-
-    return {
+    pr_details = {
         'gh_pull_req_number': 0,
         'gh_is_pr': False,
         'gh_num_pr_comments': 0,
         'git_merged_with': None,
         'gh_description_complexity': 0,
     }
+    if pr_response is None:
+        return pr_details  # Request failed: not cached, a later run may succeed
+
+    if isinstance(pr_response, list) and len(pr_response) > 0:
+        # Take the first PR found (usually the correct one)
+        pr_info = pr_response[0]
+        pr_details = {
+            'gh_pull_req_number': pr_info.get('number', 0),
+            'gh_is_pr': True,
+            'gh_num_pr_comments': pr_info.get('comments', 0),
+            'git_merged_with': pr_info.get('merge_commit_sha', None),
+            'gh_description_complexity': calculate_description_complexity(pr_info),
+        }
+
+    get_metrics_cache().put('pull_request', cache_key, pr_details, ttl=3600)  # Comment counts change over time
+    return dict(pr_details)
 
 
 
@@ -244,6 +221,34 @@ def fetch_run_details(run_id, repo_full_name, token):
     return []
 
 
+async def async_fetch_pull_request_details(repo_full_name, commit_sha, token):
+    return await run_blocking(fetch_pull_request_details, repo_full_name, commit_sha, token)
+
+
+async def async_fetch_run_details(run_id, repo_full_name, token):
+    return await run_blocking(fetch_run_details, run_id, repo_full_name, token)
+
+
+async def fetch_build_api_data(run, repo_full_name, commit_sha, workflow_filename, token):
+    """
+    Issue the per-build GitHub API round-trips concurrently: PR details, jobs/steps
+    and workflow file size. The jobs listing also provides the job IDs.
+    """
+    pr_details, run_details, workflow_size = await gather_requests(
+        async_fetch_pull_request_details(repo_full_name, commit_sha, token),
+        async_fetch_run_details(run['id'], repo_full_name, token),
+        async_count_lines_in_workflow_yml(repo_full_name, workflow_filename, commit_sha, token),
+    )
+    return {
+        'pr_details': pr_details or {
+            'gh_pull_req_number': 0, 'gh_is_pr': False, 'gh_num_pr_comments': 0,
+            'git_merged_with': None, 'gh_description_complexity': 0,
+        },
+        'run_details': run_details or [],
+        'workflow_size': workflow_size,
+    }
+
+
 
 
 # get all files in the root of a repository
@@ -252,11 +257,12 @@ def get_github_repo_files(owner, repo, token=None):
     Fetch the list of files in the root of a GitHub repository.
     """
     url = f"https://api.github.com/repos/{owner}/{repo}/contents/"
-    headers = {"Authorization": f"token {token}"} if token else {}
 
-    response = requests.get(url, headers=headers)
-    response.raise_for_status()
-    return [file['name'] for file in response.json() if file['type'] == 'file']
+    contents = get_request(url, token)
+    if not isinstance(contents, list):
+        logging.error(f"Failed to list root files for {owner}/{repo}")
+        return []
+    return [file['name'] for file in contents if file['type'] == 'file']
 
 
 
@@ -270,34 +276,78 @@ import logging
 
 def get_existing_build_ids(repo_full_name, output_csv):
     """
-    Read the CSV file and return a set of existing build IDs for the given repo.
+    Return the set of existing build IDs for the given repo, from the output's build ID index.
     This ensures we only fetch new builds.
     """
     if not os.path.exists(output_csv):
         return set()  # If file doesn't exist, process from scratch
 
-    try:
-        df = pd.read_csv(output_csv, usecols=['repo', 'id_build'])
-        df = df[df['repo'] == repo_full_name]
-        return set(df['id_build'].astype(str))  # Store existing IDs as strings for consistency
-    except Exception as e:
-        logging.error(f"Error reading existing build IDs from {output_csv}: {e}")
-        return set()
-
-def get_builds_info(repo_full_name, token, output_csv, framework_regex):
-    base_path = os.path.dirname(os.path.abspath(__file__))  # Get project folder path
+    return get_build_id_index(output_csv).ids_for_repo(repo_full_name)  # IDs are strings for consistency
+
+# GitHub returns at most this many runs for a listing filtered by `created`
+FILTERED_RUNS_CAP = 1000
+
+
+def runs_created_filter(from_date, to_date):
+    """Build the `created` qualifier of the workflow runs endpoint, or None without bounds."""
+    if from_date and to_date:
+        return f"{from_date}..{to_date}"
+    if from_date:
+        return f">={from_date}"
+    if to_date:
+        return f"<={to_date}"
+    return None
+
+
+def run_in_date_window(run, from_date, to_date):
+    """Check a run's creation date against YYYY-MM-DD bounds (both inclusive)."""
+    created_day = run['created_at'][:10]  # ISO dates compare correctly as strings
+    if from_date and created_day < from_date:
+        return False
+    if to_date and created_day > to_date[:10]:
+        return False
+    return True
+
+
+def get_builds_info(repo_full_name, token, output_csv, framework_regex, work_dir=None, known_builds_csv=None,
+                    from_date=None, to_date=None, state_dir=None, incremental=False, writer=None):
+    """
+    Collect the build metrics of every new workflow run of a repository into output_csv.
+    writer is the output backend (see open_build_writer), a CSV writer on output_csv by default.
+    work_dir isolates the clone (defaults to the project folder) and known_builds_csv is
+    the file checked for already recorded builds (defaults to the writer's output).
+    from_date/to_date (YYYY-MM-DD) restrict the runs on the server side.
+    state_dir holds the persistent crawl state: the resume checkpoint and, with incremental,
+    the high-water marks that stop listing at the first page made only of known runs.
+    Returns False if the crawl was interrupted (the clone is kept to resume later).
+    """
+    base_path = work_dir or os.path.dirname(os.path.abspath(__file__))  # Get project folder path
     repo_url = f"https://github.com/{repo_full_name}.git"
     local_repo_path = clone_repo_locally(repo_url, base_path)
+    history = CommitHistoryIndex(local_repo_path)  # One git log pass instead of one per build
 
     # Get already recorded build IDs
-    existing_build_ids = get_existing_build_ids(repo_full_name, output_csv)
+    writer = writer or CsvBuildWriter(output_csv)
+    if known_builds_csv:
+        existing_build_ids = get_existing_build_ids(repo_full_name, known_builds_csv)
+    else:
+        existing_build_ids = writer.existing_ids(repo_full_name)
+    crawl_state = RepoCrawlState(state_dir, repo_full_name) if state_dir else None
+    # Run IDs per workflow that were written or dropped by a failing stage; sets, so stage threads add to them safely
+    written_run_ids = {}
+    dropped_run_ids = {}
 
     # Fetch all workflows
     build_workflow_ids = get_workflow_all_ids(repo_full_name, token)
 
     languages = get_repository_languages(repo_full_name, token)
-    commit_cache = LRUCache(capacity=10000)
-    gh_team_size = get_team_size_last_three_months(repo_full_name, token, commit_cache)
+    commit_cache = get_metrics_cache().namespace(f"commit/{repo_full_name}")
+    gh_team_size = get_team_size_last_three_months(repo_full_name, token, get_metrics_cache())
+    if commit_store_path:  # Commits analysed by any earlier crawl are not analysed again
+        commit_metrics = PersistentCommitCache(get_commit_store(commit_store_path, classifier_version()),
+                                               repo_full_name, commit_cache)
+    else:
+        commit_metrics = commit_cache
     repo_files = get_github_repo_files(repo_full_name.split('/')[0], repo_full_name.split('/')[1], token)
     build_language = identify_build_language(repo_files)
     test_frameworks, dependency_count = identify_test_frameworks_and_count_dependencies(
@@ -306,86 +356,225 @@ def get_builds_info(repo_full_name, token, output_csv, framework_regex):
     last_end_date = None
     unique_contributors = set()
 
+    # Each discovered run flows through the stages below as a dict accumulating its data.
+    # Git analysis runs first on a single worker so commits are analysed in discovery order,
+    # which keeps the commit windows and the running committer count identical to a serial crawl.
+    def analyze_commits(build):
+        start_time = time.time()
+        run = build['run']
+        until_date = datetime.strptime(run['created_at'], '%Y-%m-%dT%H:%M:%SZ')
+        # Pass unique_contributors set to be updated within get_commit_data_local
+        build['commit_data'] = get_commit_data_local(
+            run['head_sha'], local_repo_path, until_date, build['last_end_date'], commit_metrics, unique_contributors,
+            history=history
+        )
+        build['number_of_committers'] = len(unique_contributors)
+        build['fetch_duration'] = time.time() - start_time
+        return build
+
+    def enrich_from_api(build):
+        start_time = time.time()
+        run = build['run']
+        workflow_filename = run.get('path', 'unknown_workflow.yml')
+        build['api_data'] = asyncio.run(fetch_build_api_data(run, repo_full_name, run['head_sha'], workflow_filename, token))
+        build['fetch_duration'] += time.time() - start_time
+        return build
+
+    def download_log(build):
+        build['build_log'] = get_github_actions_log(repo_full_name, build['run']['id'], token)
+        return build
+
+    def parse_log(build):
+        build['test_results'] = parse_build_log(build.pop('build_log'), build['run']['id'], framework_regex)
+        return build
+
+    def write_output(build):
+        run = build['run']
+        build_info = compile_build_info(
+            run, repo_full_name, build['commit_data'], run['head_sha'], languages,
+            build['number_of_committers'], build['total_builds'],
+            gh_team_size, build_language, test_frameworks, dependency_count, build['api_data'], build['test_results'],
+            run.get('name', 'Unknown Workflow'), build['fetch_duration']
+        )
+        # The checkpoint and high-water mark only move once the build is on disk, batching writers call back later
+        def on_written():
+            written_run_ids.setdefault(build['workflow_id'], set()).add(run['id'])
+            if crawl_state:
+                crawl_state.done(build['ticket'], run['id'])
+        writer.write([build_info], on_written=on_written)
+        return None
 
-    for workflow_id in build_workflow_ids:
-        total_builds = 0
-        page = 1
-
-        while True:
-            api_url = f"https://api.github.com/repos/{repo_full_name}/actions/workflows/{workflow_id}/runs?page={page}&per_page=100"
-            response = requests.get(api_url, headers={'Authorization': f'token {token}'})  # Make request
-
-            if response.status_code != 200:
-                logging.error(f"Failed to fetch builds for {repo_full_name} (workflow: {workflow_id}, page: {page}), status: {response.status_code}")
-                break  # Stop if request fails
-
-            response_data = response.json()
-            time.sleep(3)
-
-            if 'workflow_runs' in response_data and response_data['workflow_runs']:
-                builds_info = []
-                workflow_runs = response_data['workflow_runs'][::-1]  # Oldest to newest
-
-                for run in workflow_runs:
-                    run_id = str(run['id'])  # Convert ID to string for consistency
-
-                    if run_id in existing_build_ids:
-                        logging.info(f"Skipping existing build {run_id}")
-                        continue  # Skip already processed builds
-
-                    # If it's a new build, process it
-                    existing_build_ids.add(run_id)
-                    total_builds += 1
-
-                    start_time = time.time()
-
-                    commit_sha = run['head_sha']
-                    until_date = datetime.strptime(run['created_at'], '%Y-%m-%dT%H:%M:%SZ')
+    def drop_build(build):
+        build_log = build.pop('build_log', None)
+        if build_log is not None:
+            build_log.close()  # Release the spooled archive
+        dropped_run_ids.setdefault(build['workflow_id'], set()).add(build['run']['id'])
+        if crawl_state:
+            crawl_state.done(build['ticket'])
+
+    commit_pool = None
+    if pipeline_settings['commit_workers'] > 1 and local_repo_path:
+        commit_pool = CommitAnalysisPool(local_repo_path, history, pipeline_settings['commit_workers'])
+
+    def prefetch_commits(new_runs, last_end_date):
+        """Analyse the unindexed commits of a page's new runs in the commit pool, before they reach the git stage."""
+        commit_shas = []
+        for run in new_runs:
+            commit_shas.append(run['head_sha'])
+            if history.loaded:
+                until_date = datetime.strptime(run['created_at'], '%Y-%m-%dT%H:%M:%SZ')
+                commit_shas.extend(history.commits_between(until_date, last_end_date))
+            last_end_date = datetime.strptime(run['updated_at'], '%Y-%m-%dT%H:%M:%SZ')
+        analysed = commit_pool.prefetch(commit_shas, commit_metrics)
+        logging.info(f"Analysed {analysed} commit(s) of {len(new_runs)} run(s) in the commit pool")
+
+    # Resume an interrupted crawl at the workflow and page where it stopped
+    checkpoint = crawl_state.checkpoint() if crawl_state else None
+    if checkpoint and checkpoint['workflow_id'] in build_workflow_ids:
+        logging.info(f"Resuming {repo_full_name} at workflow {checkpoint['workflow_id']}, page {checkpoint['page']} "
+                     f"(last run written: {checkpoint.get('last_run_id')})")
+    else:
+        checkpoint = None
+    interrupted = False
 
-                    workflow_name = run.get('name', 'Unknown Workflow')
-                    workflow_filename = run.get('path', 'unknown_workflow.yml')
+    pipeline = BuildPipeline([
+        Stage('git', analyze_commits, workers=1),
+        Stage('api', enrich_from_api, workers=pipeline_settings['api_workers']),
+        Stage('download', download_log, workers=pipeline_settings['download_workers']),
+        Stage('parse', parse_log, workers=pipeline_settings['parse_workers']),
+        Stage('output', write_output, workers=1),
+    ], queue_size=pipeline_settings['queue_size'], on_error=drop_build)
 
-                    # Pass unique_contributors set to be updated within get_commit_data_local
-                    commit_data = get_commit_data_local(
-                        commit_sha, local_repo_path, until_date, last_end_date, commit_cache, unique_contributors
+    try:
+        # Run discovery: page through the runs of every workflow and feed new ones to the pipeline
+        for workflow_index, workflow_id in enumerate(build_workflow_ids):
+            total_builds = 0
+            page = 1
+            window_end = to_date  # Upper creation bound, lowered when the filtered listing cap is reached
+            high_water_mark = crawl_state.high_water_mark(workflow_id) if crawl_state else 0
+
+            if checkpoint:
+                if workflow_index < build_workflow_ids.index(checkpoint['workflow_id']):
+                    continue  # Finished before the interruption
+                if workflow_id == checkpoint['workflow_id']:
+                    page = checkpoint['page']
+                    window_end = checkpoint['window_end']
+                    total_builds = checkpoint['total_builds']
+                    if checkpoint['last_end_date']:
+                        last_end_date = datetime.fromisoformat(checkpoint['last_end_date'])
+
+            while True:
+                api_url = f"https://api.github.com/repos/{repo_full_name}/actions/workflows/{workflow_id}/runs?page={page}&per_page=100"
+                created_filter = runs_created_filter(from_date, window_end)
+                if created_filter:
+                    api_url += f"&created={quote(created_filter)}"
+                response = get_client().request(api_url, token)  # Make request
+
+                if response is None or response.status_code != 200:
+                    status = response.status_code if response is not None else 'no response'
+                    logging.error(f"Failed to fetch builds for {repo_full_name} (workflow: {workflow_id}, page: {page}), status: {status}")
+                    if response is None or status in (401, 403) or status >= 500:
+                        interrupted = True  # Network or token outage: keep the checkpoint and the clone
+                    break  # Stop if request fails
+
+                response_data = response.json()
+
+                if 'workflow_runs' in response_data and response_data['workflow_runs']:
+                    # Runs come newest first: once a page reaches past from_date, later pages are older still
+                    reached_start = from_date is not None and any(
+                        run['created_at'][:10] < from_date for run in response_data['workflow_runs']
                     )
-
-                    # Fetch line count of the workflow YAML file
-                    workflow_size = count_lines_in_workflow_yml(repo_full_name, workflow_filename, commit_sha, token)
-                    if workflow_size is None:
-                        workflow_size = None  # Ensure NaN is recorded
-
-
-
-                    #build_info['workflow_name'] = workflow_name  # Use actual workflow name
-
-                    duration_to_fetch = time.time() - start_time
-                    #build_info['fetch_duration'] = duration_to_fetch  # Add fetch duration
-
-
-                    # Compile the build info
-                    build_info = compile_build_info(
-                        run, repo_full_name, commit_data, commit_sha, languages,
-                        len(unique_contributors), total_builds,
-                        gh_team_size, build_language, test_frameworks, dependency_count, workflow_size, framework_regex ,workflow_name, duration_to_fetch
+                    workflow_runs = [run for run in response_data['workflow_runs'][::-1]  # Oldest to newest
+                                     if run_in_date_window(run, from_date, to_date)]
+                    only_known_runs = all(
+                        str(run['id']) in existing_build_ids or run['id'] <= high_water_mark for run in workflow_runs
                     )
-                    builds_info.append(build_info)
-
-                    save_builds_to_file(builds_info, output_csv)
-
-                    last_end_date = datetime.strptime(run['updated_at'], '%Y-%m-%dT%H:%M:%SZ')
-
-                logging.info(f"Processed page {page} of builds for workflow {workflow_id}")
-
-            else:
-                logging.info(f"No workflow runs found on page {page} for workflow {workflow_id}.")
-                break  # Stop if no more data
 
-            # **Fix Pagination Handling**
-            if 'next' in response.headers.get('Link', ''):
-                page += 1
-            else:
-                break  # No more pages left
+                    if commit_pool:
+                        prefetch_commits([run for run in workflow_runs if str(run['id']) not in existing_build_ids],
+                                         last_end_date)
+
+                    for run in workflow_runs:
+                        run_id = str(run['id'])  # Convert ID to string for consistency
+
+                        if run_id in existing_build_ids:
+                            logging.info(f"Skipping existing build {run_id}")
+                            continue  # Skip already processed builds
+
+                        # If it's a new build, process it
+                        existing_build_ids.add(run_id)
+                        total_builds += 1
+
+                        ticket = crawl_state.register({
+                            'workflow_id': workflow_id, 'page': page, 'window_end': window_end,
+                            'total_builds': total_builds - 1,
+                            'last_end_date': last_end_date.isoformat() if last_end_date else None,
+                        }) if crawl_state else None
+
+                        pipeline.put({'run': run, 'workflow_id': workflow_id, 'total_builds': total_builds,
+                                      'last_end_date': last_end_date, 'ticket': ticket})
+
+                        last_end_date = datetime.strptime(run['updated_at'], '%Y-%m-%dT%H:%M:%SZ')
+
+                    logging.info(f"Queued page {page} of builds for workflow {workflow_id}, queue depths: {pipeline.queue_depths()}")
+
+                else:
+                    logging.info(f"No workflow runs found on page {page} for workflow {workflow_id}.")
+                    break  # Stop if no more data
+
+                if reached_start:
+                    break  # The rest of the history is older than the window
+                if incremental and workflow_runs and only_known_runs:
+                    logging.info(f"Page {page} of workflow {workflow_id} holds only known runs, stopping incremental listing.")
+                    break  # Runs come newest first, everything further back is known too
+
+                # **Fix Pagination Handling**
+                if 'next' in response.headers.get('Link', ''):
+                    if created_filter and page * 100 >= FILTERED_RUNS_CAP:
+                        # Filtered listings stop at 1000 runs: continue below the oldest run seen so far
+                        oldest_created_at = response_data['workflow_runs'][-1]['created_at']
+                        if oldest_created_at == window_end:
+                            logging.warning(f"More than {FILTERED_RUNS_CAP} runs created at {oldest_created_at}, some were skipped.")
+                            break
+                        window_end = oldest_created_at
+                        page = 1
+                    else:
+                        page += 1
+                else:
+                    break  # No more pages left
+
+                if crawl_state:
+                    crawl_state.advance({
+                        'workflow_id': workflow_id, 'page': page, 'window_end': window_end,
+                        'total_builds': total_builds,
+                        'last_end_date': last_end_date.isoformat() if last_end_date else None,
+                    })
+
+            if interrupted:
+                break
+    finally:
+        pipeline.close()  # Drain every stage before the clone goes away
+        writer.flush()
+        if commit_pool:
+            commit_pool.close()
+        if local_repo_path:
+            close_object_reader(local_repo_path)
+
+    if interrupted:
+        logging.error(f"Crawl of {repo_full_name} interrupted, it will resume from its checkpoint. "
+                      f"Keeping the clone at {local_repo_path}")
+        return False
+
+    # Move each high-water mark to the newest written run, but never past a dropped run so the
+    # next incremental crawl lists it again
+    if crawl_state:
+        for workflow_id, run_ids in written_run_ids.items():
+            oldest_dropped = min(dropped_run_ids.get(workflow_id, ()), default=None)
+            mark = max((run_id for run_id in run_ids if oldest_dropped is None or run_id < oldest_dropped), default=None)
+            if mark is not None:
+                crawl_state.raise_high_water_mark(workflow_id, mark)
+        crawl_state.clear_checkpoint()
+        crawl_state.save()
 
     logging.info(f"Finished processing {repo_full_name}. Cleaning up...")
 
@@ -394,56 +583,63 @@ def get_builds_info(repo_full_name, token, output_csv, framework_regex):
         shutil.rmtree(local_repo_path, ignore_errors=True)
         logging.info(f"Deleted temporary repository: {local_repo_path}")
 
-    time.sleep(15)  # Prevent token exhaustion
     unique_contributors.clear()
+    get_metrics_cache().log_stats()
+    return True
+
+
+
 
 
 
 
 
 
+def parse_build_log(build_log, run_id, framework_regex):
+    """
+    Parse the test results out of a run's ZIP log archive, given as the file returned by
+    get_github_actions_log (closed here) or as bytes. Each member is scanned in one pass for
+    every framework pattern: the frameworks are detected from the log content itself.
+    Returns the totals, plus the counts of each framework found under 'frameworks'. A
+    LogParsingError (a member could not be scanned) is left to the pipeline, which drops
+    the build rather than writing incomplete counts.
+    """
+    cumulative_test_results = {'passed': 0, 'failed': 0, 'skipped': 0, 'total': 0, 'frameworks': {}}
+    if build_log is None:
+        return cumulative_test_results
+
+    archive = build_log if hasattr(build_log, 'read') else io.BytesIO(build_log)
+    try:
+        with zipfile.ZipFile(archive, 'r') as zip_ref:
+            # Members are scanned inline or in the process pool, see --log-parsing
+            for filename, framework_results in get_log_parsing_executor().parse_members(zip_ref, framework_regex):
+                for framework, test_results in framework_results.items():
+                    add_test_results(cumulative_test_results, test_results)
+                    add_test_results(cumulative_test_results['frameworks'].setdefault(
+                        framework, {'passed': 0, 'failed': 0, 'skipped': 0, 'total': 0}), test_results)
+                    print(f"Parsed {framework} test results from {filename}: {test_results}")
+    except zipfile.BadZipFile:
+        print(f"Failed to unzip log file for build {run_id}")
+    finally:
+        archive.close()  # Deletes the spooled file if it went to disk
 
+    return cumulative_test_results
 
 
 def compile_build_info(run, repo_full_name, commit_data, commit_sha, languages, number_of_committers, total_builds, gh_team_size,
-                       build_language, test_frameworks , dependency_count , workflow_size , framework_regex , workflow_name, duration_to_fetch):
+                       build_language, test_frameworks , dependency_count , api_data , cumulative_test_results , workflow_name, duration_to_fetch):
     # Parsing build start and end times
     start_time = datetime.strptime(run['created_at'], '%Y-%m-%dT%H:%M:%SZ')
     end_time = datetime.strptime(run['updated_at'], '%Y-%m-%dT%H:%M:%SZ')
     duration = (end_time - start_time).total_seconds()
-    jobs_ids, job_count = get_jobs_for_run(repo_full_name, run['id'], github_token)  # Get job IDs and count
-
-    ### NEWLY ADDED CODE ##############################################################
-    # You may get multiple frameworks; decide how to handle this case
-    determined_framework = test_frameworks[0] if test_frameworks else "unknown"  # Default or handle appropriately
-
-    # Proceed with existing logic, including log fetching and parsing
-    build_log = get_github_actions_log(repo_full_name, run['id'], github_token)
-    cumulative_test_results = {'passed': 0, 'failed': 0, 'skipped': 0, 'total': 0}
-
-    try:
-        with zipfile.ZipFile(io.BytesIO(build_log), 'r') as zip_ref:
-            for file_info in zip_ref.infolist():
-                if file_info.filename.endswith('.txt'):
-                    with zip_ref.open(file_info) as log_file:
-                        for line in log_file:
-                            log_content = line.decode('utf-8').strip()  # Process line-by-line
-                            if log_content:
-                                test_results = parse_test_results(determined_framework, log_content, build_language, framework_regex)
-                                cumulative_test_results['passed'] += test_results['passed']
-                                cumulative_test_results['failed'] += test_results['failed']
-                                cumulative_test_results['skipped'] += test_results['skipped']
-                                cumulative_test_results['total'] += test_results['total']
-                                print(f"Parsed test results from {file_info.filename}: {test_results}")
-    except zipfile.BadZipFile:
-        print(f"Failed to unzip log file for build {run['id']}")
-    ### END OF NEWLY ADDED CODE #######################################################
+    run_details = api_data['run_details']  # Jobs of the run, each containing steps
+    jobs_ids = [job['id'] for job in run_details]
+    job_count = len(jobs_ids)
 
     # Check if this build is PR-related
-    pr_details = fetch_pull_request_details(repo_full_name, commit_sha, github_token)
+    pr_details = api_data['pr_details']
 
     # Determine if tests ran by checking 'steps' in each job
-    run_details = fetch_run_details(run['id'], repo_full_name, github_token)
     tests_ran = any("test" in step['name'].lower() for job in run_details for step in job.get('steps', []))
 
     # Compile the build information dictionary
@@ -491,12 +687,13 @@ def compile_build_info(run, repo_full_name, commit_data, commit_sha, languages,
         'gh_team_size_last_3_month': gh_team_size,
         'build_language': build_language,
         'dependencies_count': dependency_count,  
-        'workflow_size': workflow_size, 
+        'workflow_size': api_data['workflow_size'],
         'test_framework': test_frameworks,
         'tests_passed': cumulative_test_results['passed'],
         'tests_failed': cumulative_test_results['failed'],
         'tests_skipped': cumulative_test_results['skipped'],
         'tests_total': cumulative_test_results['total'],
+        'tests_per_framework': json.dumps(cumulative_test_results.get('frameworks', {}), sort_keys=True),
         'workflow_name' : workflow_name,
         'fetch_duration' : duration_to_fetch
     }
@@ -509,30 +706,178 @@ def compile_build_info(run, repo_full_name, commit_data, commit_sha, languages,
 
 
 
+def init_worker(settings):
+    """Apply the command line settings inside a worker process of the repository pool."""
+    global github_token, from_date, to_date, crawl_state_dir, incremental, output_format, output_path, commit_store_path
+    github_token = settings['token']
+    output_format = settings['output_format']
+    output_path = settings['output_path']
+    from_date = settings['from_date']
+    to_date = settings['to_date']
+    crawl_state_dir = settings['state_dir']
+    incremental = settings['incremental']
+    commit_store_path = settings['commit_store']
+    pipeline_settings.update(settings['pipeline'])
+    configure_metrics_cache(settings['memory_cache_mb'] * 1024 * 1024)
+    configure_log_spooling(settings['log_memory_mb'] * 1024 * 1024)
+    configure_log_parsing(settings['log_parsing'], settings['log_workers'])
+    configure_client(cache_dir=settings['cache_dir'], max_in_flight=settings['concurrency'])
+    configure_concurrency(settings['concurrency'])
+
+
+def process_repository_shard(repo_full_name, shard_dir):
+    """
+    Worker entry point: crawl one repository with its own clone directory. CSV builds go to
+    a private shard, which the parent merges into the main output; Parquet and SQLite builds
+    are written straight to the dataset partition or the shared database.
+    Returns True if the repository was crawled to the end.
+    """
+    os.makedirs(shard_dir, exist_ok=True)
+    try:
+        if output_format != 'csv':
+            writer = open_build_writer(output_format, output_path)
+            try:
+                return get_builds_info(repo_full_name, github_token, None, framework_regex, work_dir=shard_dir,
+                                       from_date=from_date, to_date=to_date, state_dir=crawl_state_dir,
+                                       incremental=incremental, writer=writer)
+            finally:
+                writer.close()
+
+        shard_csv = os.path.join(shard_dir, 'builds.csv')
+        save_head(shard_csv)
+        return get_builds_info(repo_full_name, github_token, shard_csv, framework_regex, work_dir=shard_dir,
+                               known_builds_csv=output_path, from_date=from_date, to_date=to_date,
+                               state_dir=crawl_state_dir, incremental=incremental)
+    finally:
+        get_log_parsing_executor().close()  # Stop this worker's log parsing processes
+
+
+def run_repositories_in_pool(repo_names, workers, settings):
+    """
+    Crawl several repositories in parallel processes. For CSV output only this (parent)
+    process writes the main output: each finished shard is merged into it and then removed.
+    """
+    shards_root = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tmp", "shards")
+    if output_format == 'csv':
+        get_build_id_index(output_path)  # Build the index file once, before workers read it
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(settings,)) as executor:
+        futures = {}
+        for repo_full_name in repo_names:
+            shard_dir = os.path.join(shards_root, repo_full_name.replace('/', '__'))
+            futures[executor.submit(process_repository_shard, repo_full_name, shard_dir)] = (repo_full_name, shard_dir)
+
+        for future in as_completed(futures):
+            repo_full_name, shard_dir = futures[future]
+            finished = False
+            try:
+                finished = future.result()
+            except Exception as e:
+                logging.error(f"Worker failed while processing {repo_full_name}: {e}")
+
+            if output_format != 'csv':
+                if finished:
+                    shutil.rmtree(shard_dir, ignore_errors=True)
+                continue  # The worker wrote its partition itself
+
+            # Keep whatever the worker managed to write, even after a failure
+            shard_csv = os.path.join(shard_dir, 'builds.csv')
+            merged = merge_output_shard(shard_csv, output_path)
+            logging.info(f"Merged {merged} build(s) of {repo_full_name} into {output_path}")
+            if finished:
+                shutil.rmtree(shard_dir, ignore_errors=True)
+            elif os.path.exists(shard_csv):
+                os.remove(shard_csv)  # Merged already; the clone stays for the resumed crawl
+
+
 def main():
     global github_token
     global to_date
     global from_date
+    global crawl_state_dir
+    global incremental
+    global output_format
+    global output_path
+    global commit_store_path
     projects_file = 'github_projects.csv'
     single_project = None
     parser = argparse.ArgumentParser()
-    parser.add_argument("-t", "--token", help="github token")
+    parser.add_argument("-t", "--token", help="github token, comma-separated tokens, or a file with one token per line")
     parser.add_argument("-p", "--projects", help="csv of projects list")
     parser.add_argument("-s", "--single-project", help="GitHub repository URL for single project analysis")
-    parser.add_argument("-fd", "--from_date", help="since date")
-    parser.add_argument("-td", "--to_date", help="to date")
+    parser.add_argument("-fd", "--from_date", help="since date (YYYY-MM-DD)")
+    parser.add_argument("-td", "--to_date", help="to date (YYYY-MM-DD)")
+    parser.add_argument("--cache-dir", help="directory of the conditional-request cache for GitHub API responses",
+                        default=os.path.join(os.path.dirname(os.path.abspath(__file__)), ".github_cache"))
+    parser.add_argument("--no-cache", action="store_true", help="disable the GitHub API response cache")
+    parser.add_argument("--memory-cache-mb", type=int, default=512,
+                        help="memory budget of the in-process cache of commit, pull request and file data (MB)")
+    parser.add_argument("--concurrency", type=int, default=8, help="maximum number of GitHub requests in flight")
+    parser.add_argument("--api-workers", type=int, default=pipeline_settings['api_workers'],
+                        help="threads of the API enrichment stage")
+    parser.add_argument("--download-workers", type=int, default=pipeline_settings['download_workers'],
+                        help="threads of the log download stage")
+    parser.add_argument("--parse-workers", type=int, default=pipeline_settings['parse_workers'],
+                        help="threads of the log parsing stage")
+    parser.add_argument("--log-memory-mb", type=int, default=16,
+                        help="memory held by each log archive in flight before it is spooled to disk (MB)")
+    parser.add_argument("--log-parsing", choices=LOG_PARSING_MODES, default='inline',
+                        help="scan log members in the parse stage threads, or in a process pool")
+    parser.add_argument("--log-workers", type=int, help="processes of the log parsing pool "
+                                                        "(default: CPU count, divided among --workers)")
+    parser.add_argument("--commit-workers", type=int, default=pipeline_settings['commit_workers'],
+                        help="processes analysing the commits of each page of runs ahead of the git stage")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="number of repositories of the projects CSV crawled in parallel processes")
+    parser.add_argument("--incremental", action="store_true",
+                        help="stop listing a workflow's runs at the first page containing only known runs")
+    parser.add_argument("--state-dir", default=crawl_state_dir, help="directory of the persistent crawl state")
+    parser.add_argument("--commit-store", default=commit_store_path,
+                        help="SQLite database of the per-commit metrics, reused across crawls")
+    parser.add_argument("--no-commit-store", action="store_true", help="disable the persistent commit metrics store")
+    parser.add_argument("--output-format", choices=OUTPUT_FORMATS, default=output_format,
+                        help="output backend: a CSV file, a Parquet dataset partitioned by repository, "
+                             "or a SQLite database")
+    parser.add_argument("-o", "--output", help="output CSV file, Parquet dataset directory or SQLite database "
+                                               "(default: builds_features.csv, builds_features/, builds_features.db)")
     args = parser.parse_args()
+    git_error = check_git_version()
+    if git_error:
+        parser.error(git_error)  # Commit metrics would silently come out empty
+
+    configure_client(cache_dir=None if args.no_cache else args.cache_dir, max_in_flight=args.concurrency)
+    configure_concurrency(args.concurrency)
+    configure_metrics_cache(args.memory_cache_mb * 1024 * 1024)
+    configure_log_spooling(args.log_memory_mb * 1024 * 1024)
+    configure_log_parsing(args.log_parsing, args.log_workers)
+    pipeline_settings['api_workers'] = args.api_workers
+    pipeline_settings['download_workers'] = args.download_workers
+    pipeline_settings['parse_workers'] = args.parse_workers
+    pipeline_settings['commit_workers'] = args.commit_workers
 
     if args.token: 
-        github_token = args.token
+        tokens = load_tokens(args.token)
+        if not tokens:
+            parser.error(f"no GitHub token found in --token {args.token!r}")
+        github_token = TokenPool(tokens) if len(tokens) > 1 else tokens[0]
     if args.projects:
         projects_file = args.projects
     if args.single_project:
         single_project = args.single_project
+    for bound in (args.from_date, args.to_date):
+        if bound:
+            datetime.strptime(bound, '%Y-%m-%d')  # Fail early on a malformed date
+    crawl_state_dir = args.state_dir
+    incremental = args.incremental
+    commit_store_path = None if args.no_commit_store else args.commit_store
     if args.to_date:
         to_date = args.to_date
     if args.from_date:
         from_date = args.from_date
+    output_format = args.output_format
+    default_outputs = {'csv': output_csv, 'parquet': os.path.splitext(output_csv)[0],
+                       'sqlite': f"{os.path.splitext(output_csv)[0]}.db"}
+    output_path = args.output or default_outputs[output_format]
 
     projects = []
     
@@ -540,8 +885,13 @@ def main():
     if single_project:
         # If a single project is specified, process only that
         repo_full_name = single_project.split('/')[-2] + '/' + single_project.split('/')[-1]
-        save_head(output_csv)
-        get_builds_info(repo_full_name, github_token, output_csv, framework_regex)
+        if output_format == 'csv':
+            save_head(output_path)
+        writer = open_build_writer(output_format, output_path)
+        get_builds_info(repo_full_name, github_token, output_path, framework_regex,
+                        from_date=from_date, to_date=to_date,
+                        state_dir=crawl_state_dir, incremental=incremental, writer=writer)
+        writer.close()
     else:
         # If a CSV file is provided, process all projects in the file
         with open(projects_file, 'r') as csvfile:
@@ -549,21 +899,52 @@ def main():
             for row in csv_reader:
                 projects.append(row[0])
 
-        save_head(output_csv)
-        
-        # Process each project URL
+        if output_format == 'csv':
+            save_head(output_path)
+
+        repo_names = []
         for project in projects:
             name = project.split('/')
             
             # Check if the URL is valid before proceeding
             if len(name) >= 2:
-                repo_full_name = f"{name[-2]}/{name[-1]}"
-                get_builds_info(repo_full_name, github_token, output_csv, framework_regex)
+                repo_names.append(f"{name[-2]}/{name[-1]}")
             else:
                 print(name)
                 logging.error(f"Invalid URL format for project: {project}")
+
+        if args.workers > 1:
+            settings = {
+                'token': github_token,
+                'pipeline': dict(pipeline_settings),
+                'cache_dir': None if args.no_cache else args.cache_dir,
+                'concurrency': args.concurrency,
+                'memory_cache_mb': args.memory_cache_mb,
+                'log_memory_mb': args.log_memory_mb,
+                'log_parsing': args.log_parsing,
+                # Repository workers share the CPUs: by default each gets its part for log parsing
+                'log_workers': args.log_workers or max(1, (os.cpu_count() or 1) // args.workers),
+                'from_date': from_date,
+                'to_date': to_date,
+                'state_dir': crawl_state_dir,
+                'incremental': incremental,
+                'commit_store': commit_store_path,
+                'output_format': output_format,
+                'output_path': output_path,
+            }
+            run_repositories_in_pool(repo_names, args.workers, settings)
+        else:
+            # Process each project
+            writer = open_build_writer(output_format, output_path)
+            for repo_full_name in repo_names:
+                get_builds_info(repo_full_name, github_token, output_path, framework_regex,
+                                from_date=from_date, to_date=to_date,
+                                state_dir=crawl_state_dir, incremental=incremental, writer=writer)
+            writer.close()
     
-    logging.info("Build information processed and saved to output CSV.")
+    get_log_parsing_executor().close()
+    logging.info(f"Build information processed and saved to {output_path}.")
+    get_client().log_stats()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,65 @@
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from request_github import get_request
+from log_parser import get_github_actions_log
+from repo_info_collector import count_lines_in_workflow_yml
+
+# Awaitable wrappers around the fetch layer. Requests are issued through the shared
+# pooled client (retries, rate limits and caching stay in one place) on a bounded
+# executor, so at most `concurrency` GitHub calls are in flight per process.
+
+_executor = None
+_executor_lock = threading.Lock()
+_concurrency = 8
+
+
+def configure_concurrency(limit):
+    """Set the maximum number of GitHub requests in flight (call before the first request)."""
+    global _executor, _concurrency
+    with _executor_lock:
+        _concurrency = max(1, int(limit))
+        if _executor is not None:
+            _executor.shutdown(wait=False)
+            _executor = None
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=_concurrency, thread_name_prefix="github-io")
+        return _executor
+
+
+async def run_blocking(func, *args):
+    """Run a blocking fetch function on the bounded I/O executor and await its result."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_executor(), func, *args)
+
+
+async def async_get_request(url, token):
+    return await run_blocking(get_request, url, token)
+
+
+async def async_get_github_actions_log(repo_full_name, run_id, token=None):
+    return await run_blocking(get_github_actions_log, repo_full_name, run_id, token)
+
+
+async def async_count_lines_in_workflow_yml(repo_full_name, workflow_path, commit_sha, token):
+    return await run_blocking(count_lines_in_workflow_yml, repo_full_name, workflow_path, commit_sha, token)
+
+
+async def gather_requests(*awaitables):
+    """
+    Await several fetches concurrently. A failing fetch is logged and yields None
+    instead of cancelling its siblings, matching the None-on-error convention of the sync layer.
+    """
+    results = await asyncio.gather(*awaitables, return_exceptions=True)
+    for index, result in enumerate(results):
+        if isinstance(result, Exception):
+            logging.error(f"Concurrent GitHub fetch failed: {result}")
+            results[index] = None
+    return results
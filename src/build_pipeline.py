@@ -0,0 +1,95 @@
+import logging
+import queue
+import threading
+
+_STOP = object()  # Sentinel telling a worker that its input is exhausted
+
+
+class Stage:
+    """A named processing step: `func(item)` returns the item for the next stage, or None to drop it."""
+
+    def __init__(self, name, func, workers=1):
+        self.name = name
+        self.func = func
+        self.workers = max(1, int(workers))
+
+
+class BuildPipeline:
+    """
+    Producer/consumer pipeline: items pushed with put() flow through the stages in order.
+    Stages are connected by bounded queues (so a slow stage applies back-pressure
+    upstream) and each stage has its own pool of worker threads. A stage with a single
+    worker keeps the order in which items arrive.
+    """
+
+    def __init__(self, stages, queue_size=16, monitor_interval=60, on_error=None):
+        self.stages = stages
+        self.on_error = on_error  # Called with an item dropped because a stage failed on it
+        self.queues = [queue.Queue(maxsize=queue_size) for _ in stages]
+        self.processed = {stage.name: 0 for stage in stages}
+        self._finished_workers = [0] * len(stages)
+        self._lock = threading.Lock()
+        self._threads = []
+        self._monitor_interval = monitor_interval
+        self._closed = threading.Event()
+
+        for index, stage in enumerate(stages):
+            for worker in range(stage.workers):
+                thread = threading.Thread(target=self._work, args=(index,), daemon=True,
+                                          name=f"{stage.name}-{worker}")
+                thread.start()
+                self._threads.append(thread)
+
+        if monitor_interval:
+            threading.Thread(target=self._monitor, daemon=True, name="pipeline-monitor").start()
+
+    def put(self, item):
+        """Feed an item to the first stage (blocks while that stage's queue is full)."""
+        self.queues[0].put(item)
+
+    def queue_depths(self):
+        """Number of items waiting in front of each stage, the largest one is the bottleneck."""
+        return {stage.name: self.queues[index].qsize() for index, stage in enumerate(self.stages)}
+
+    def close(self):
+        """Signal the end of input and wait until every item has left the last stage."""
+        for _ in range(self.stages[0].workers):
+            self.queues[0].put(_STOP)
+        for thread in self._threads:
+            thread.join()
+        self._closed.set()
+        logging.info(f"Pipeline finished, items processed per stage: {self.processed}")
+
+    def _work(self, index):
+        stage = self.stages[index]
+        input_queue = self.queues[index]
+        output_queue = self.queues[index + 1] if index + 1 < len(self.stages) else None
+
+        while True:
+            item = input_queue.get()
+            if item is _STOP:
+                break
+            try:
+                result = stage.func(item)
+            except Exception as e:
+                logging.error(f"Pipeline stage '{stage.name}' failed: {e}", exc_info=True)
+                if self.on_error is not None:
+                    self.on_error(item)
+                continue  # Drop the item, keep the stage alive
+            with self._lock:
+                self.processed[stage.name] += 1
+            if result is not None and output_queue is not None:
+                output_queue.put(result)
+
+        # The last worker of a stage to finish closes the next stage
+        with self._lock:
+            self._finished_workers[index] += 1
+            last_worker = self._finished_workers[index] == stage.workers
+        if last_worker and output_queue is not None:
+            for _ in range(self.stages[index + 1].workers):
+                output_queue.put(_STOP)
+
+    def _monitor(self):
+        while not self._closed.wait(self._monitor_interval):
+            depths = ', '.join(f"{name}={depth}" for name, depth in self.queue_depths().items())
+            logging.info(f"Pipeline queue depths: {depths}")
@@ -1,8 +1,17 @@
 import requests
+import bisect
+import hashlib
+import inspect
 import logging
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from datetime import datetime, timezone, timedelta
 import os
+import re
+import file_indicators
 from file_indicators import is_production_file , is_test_file
+from git_object_reader import get_object_reader
 import subprocess
 
 
@@ -70,42 +79,237 @@ def is_documentation_file(file_path):
     return False
 
 
+def summarize_commit(author_name, file_entries):
+    """
+    Compute the metrics of one commit from its changed files.
+    file_entries holds (status, added_lines, removed_lines, file_path) tuples, where status
+    is git's change letter: A(dded), D(eleted), anything else counts as modified.
+    """
+    total_added = total_removed = tests_added = tests_removed = 0
+    src_files = doc_files = other_files = 0
+    file_types = set()
+    file_changes = []
 
-import subprocess
-import logging
-import os
+    unique_files_added = set()
+    unique_files_deleted = set()
+    unique_files_modified = set()
 
-import subprocess
-import logging
-import os
+    for status, added_lines, removed_lines, filename in file_entries:
+        # **Track total added/removed lines**
+        total_added += added_lines
+        total_removed += removed_lines
+
+        if status == 'A':
+            unique_files_added.add(filename)
+        elif status == 'D':
+            unique_files_deleted.add(filename)
+        else:
+            unique_files_modified.add(filename)
+
+        # **Classify files**
+        if is_test_file(filename):
+            tests_added += added_lines
+            tests_removed += removed_lines
+        elif is_production_file(filename):
+            src_files += 1
+        elif is_documentation_file(filename):
+            doc_files += 1
+        else:
+            other_files += 1
 
-def get_file_line_count(commit_sha, file_path, local_repo_path):
+        # **Track file extensions**
+        file_extension = os.path.splitext(filename)[1]
+        if file_extension:
+            file_types.add(file_extension)
+
+        # **Store file change data**
+        file_changes.append({
+            "file_path": filename,
+            "added_lines": added_lines,
+            "removed_lines": removed_lines
+        })
+
+    return {
+        'author': author_name,
+        'total_added': total_added,
+        'total_removed': total_removed,
+        'tests_added': tests_added,
+        'tests_removed': tests_removed,
+        'src_files': src_files,
+        'doc_files': doc_files,
+        'other_files': other_files,
+        'file_types': file_types,
+        'file_changes': file_changes,
+        'gh_files_added': len(unique_files_added),
+        'gh_files_deleted': len(unique_files_deleted),
+        'gh_files_modified': len(unique_files_modified),
+    }
+
+
+# Diff options of both the history index and the per-commit `git show`, so they report the same files.
+# Renames are detected (a renamed file is one modified file carrying only its edited lines) and
+# merges are diffed against their first parent (what the branch received); by default git log lists
+# no files for them at all.
+DIFF_OPTIONS = ["--raw", "--numstat", "-M", "--diff-merges=first-parent"]
+MIN_GIT_VERSION = (2, 31)  # First release with --diff-merges
+
+
+def check_git_version():
+    """Error message if git cannot run DIFF_OPTIONS (missing, or older than MIN_GIT_VERSION), else None."""
+    try:
+        output = subprocess.run(["git", "--version"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError) as e:
+        return f"git could not be run: {e}"
+    match = re.search(r"(\d+)\.(\d+)", output)
+    if match is None or tuple(int(part) for part in match.groups()) < MIN_GIT_VERSION:
+        return f"git {'.'.join(map(str, MIN_GIT_VERSION))} or later is required, found '{output}'"
+    return None
+
+
+def classifier_version():
     """
-    Get the total number of lines in a file at a specific commit SHA.
-    Returns the line count or None if the file doesn't exist at that commit.
+    Hash of the code classifying changed files and of the git diff options: commit metrics
+    computed by other code are stale.
     """
-    try:
-        result = subprocess.run(
-            ["git", "-C", local_repo_path, "show", f"{commit_sha}:{file_path}"],
-            capture_output=True, text=True, encoding="utf-8", errors="replace", check=True
-        )
-        return len(result.stdout.splitlines())  # Count total lines in the file
-    except subprocess.CalledProcessError:
-        return None  # File does not exist at this commit
+    source = ''.join(inspect.getsource(code) for code in (file_indicators, is_documentation_file, summarize_commit))
+    source += repr(DIFF_OPTIONS)
+    return hashlib.sha1(source.encode('utf-8')).hexdigest()[:12]
 
-def get_last_commit_containing_file(file_path, commit_sha, local_repo_path):
+
+def parse_change_line(line, raw_entries):
     """
-    Find the last commit before `commit_sha` where `file_path` existed.
+    Parse one line of the `git log`/`git show` output of DIFF_OPTIONS. A --raw line queues the
+    file's (status letter, path) in the `raw_entries` deque; a --numstat line, which comes in
+    the same order, takes the next one and returns its (status, added_lines, removed_lines,
+    file_path) entry. Renamed (R) and copied (C) files are reported under their new path and
+    count as modified. Returns None for other lines.
     """
-    try:
-        result = subprocess.run(
-            ["git", "-C", local_repo_path, "log", "--format=%H", "--", file_path],
-            capture_output=True, text=True, encoding="utf-8", errors="replace", check=True
-        )
-        commits = result.stdout.strip().split("\n")
-        return commits[1] if len(commits) > 1 else None  # Get the last known commit before deletion
-    except subprocess.CalledProcessError:
-        return None  # File has no prior history
+    if line.startswith(":"):  # --raw: ":<modes> <blobs> <status>\t<path>", "\t<old path>\t<new path>" for R and C
+        parts = line.split("\t")
+        raw_entries.append((parts[0].split()[-1][:1], parts[-1]))
+        return None
+    parts = line.split("\t")
+    if len(parts) != 3:
+        return None  # Skip malformed lines
+    added_lines, removed_lines, filename = parts
+    status = 'M'
+    if raw_entries:
+        status, filename = raw_entries.popleft()  # The numstat path of a rename is "old => new"
+    return (
+        status,
+        int(added_lines) if added_lines.isdigit() else 0,
+        int(removed_lines) if removed_lines.isdigit() else 0,  # "-" for binary files
+        filename,
+    )
+
+
+def _utc_timestamp(date):
+    """Seconds since the epoch of a naive UTC datetime (the format of the run dates)."""
+    return date.replace(tzinfo=timezone.utc).timestamp()
+
+
+class CommitHistoryIndex:
+    """
+    In-memory index of the history of a clone, built by a single streaming `git log` pass:
+    every commit reachable from HEAD with its author and per-file status and added/removed
+    lines, sorted by committer date. The commit window of a build is then a bisection
+    instead of a git process per build, and the data of a commit needs no `git show`.
+    """
+
+    def __init__(self, local_repo_path):
+        self.loaded = False
+        self._files = {}  # sha -> list of (status, added_lines, removed_lines, file_path)
+        self._authors = {}
+        self._timestamps = []  # Sorted committer timestamps, aligned with _shas
+        self._shas = []
+        if local_repo_path and os.path.exists(local_repo_path):
+            self._load(local_repo_path)
+
+    def _load(self, local_repo_path):
+        command = ["git", "-C", local_repo_path, "-c", "core.quotePath=false", "log", *DIFF_OPTIONS,
+                   "--format=%x1e%H%x1f%ct%x1f%P%x1f%an"]
+        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                   text=True, encoding="utf-8", errors="replace")
+        dated_shas = []
+        newest_merge = None
+        sha = None
+        raw_entries = deque()
+        with process.stdout:
+            for line in process.stdout:
+                line = line.rstrip("\n")
+                if line.startswith("\x1e"):  # Header of the next commit
+                    sha, timestamp, parents, author = line[1:].split("\x1f", 3)
+                    if newest_merge is None and len(parents.split()) > 1:
+                        newest_merge = sha
+                    dated_shas.append((int(timestamp), sha))
+                    self._authors[sha] = author
+                    self._files[sha] = []
+                    raw_entries = deque()
+                elif line and sha is not None:
+                    entry = parse_change_line(line, raw_entries)
+                    if entry:
+                        self._files[sha].append(entry)
+        stderr = process.stderr.read()
+        process.stderr.close()
+        if process.wait() != 0:
+            logging.error(f"Failed to index the history of {local_repo_path}: {stderr.strip()}")
+            return
+
+        dated_shas.sort()
+        self._timestamps = [timestamp for timestamp, _ in dated_shas]
+        self._shas = [sha for _, sha in dated_shas]
+        self.loaded = True
+        logging.info(f"Indexed {len(self._shas)} commit(s) of {local_repo_path}")
+        if newest_merge is not None:
+            self._check_commit(local_repo_path, newest_merge)
+
+    def _check_commit(self, local_repo_path, sha):
+        """
+        Compare the indexed metrics of a commit (the newest merge, the case git log and git
+        show are most likely to disagree on) with `git show`; on a mismatch the index only
+        serves commit windows and every commit is read with git show.
+        """
+        expected = fetch_full_commit_data_local(sha, local_repo_path, set())
+        if expected and expected != self.commit_data(sha):
+            logging.error(f"History index of {local_repo_path} disagrees with git show on {sha}, "
+                          f"reading commits with git show")
+            self._files = {}
+            self._authors = {}
+
+    def __contains__(self, sha):
+        return sha in self._files
+
+    def __len__(self):
+        return len(self._shas)
+
+    def commit_data(self, sha):
+        """Metrics of an indexed commit (see summarize_commit), or None if it is not indexed."""
+        if sha not in self._files:
+            return None
+        return summarize_commit(self._authors[sha], self._files[sha])
+
+    def commits_between(self, until_date, last_end_date=None, first_build_limit=10):
+        """
+        SHAs of the commits dated between last_end_date and until_date (both inclusive, like
+        git's --since/--until), newest first. Without last_end_date (first build), the
+        first_build_limit newest commits up to until_date.
+        """
+        end = bisect.bisect_right(self._timestamps, _utc_timestamp(until_date))
+        if last_end_date is None:
+            start = max(0, end - first_build_limit)
+        else:
+            start = bisect.bisect_left(self._timestamps, _utc_timestamp(last_end_date))
+        return self._shas[start:end][::-1]
+
+
+
+import subprocess
+import logging
+import os
+
+import subprocess
+import logging
+import os
 
 def fetch_full_commit_data_local(commit_sha, local_repo_path, unique_contributors):
     """Fetch detailed commit data using local Git, ensuring the commit exists before retrieving details."""
@@ -114,17 +318,19 @@ def fetch_full_commit_data_local(commit_sha, local_repo_path, unique_contributor
             logging.error(f"Repository path does not exist: {local_repo_path}")
             return {}
 
-        # **Ensure the commit exists locally by fetching it explicitly**
-        fetch_result = subprocess.run(
-            ["git", "-C", local_repo_path, "fetch", "origin", commit_sha],
-            capture_output=True, text=True, encoding="utf-8", errors="replace"
-        )
-        if fetch_result.returncode != 0:
-            logging.warning(f"Failed to fetch commit {commit_sha}: {fetch_result.stderr.strip()}")
+        # **Ensure the commit exists locally, fetching it explicitly if the clone lacks it**
+        if not get_object_reader(local_repo_path).exists(commit_sha):
+            fetch_result = subprocess.run(
+                ["git", "-C", local_repo_path, "fetch", "origin", commit_sha],
+                capture_output=True, text=True, encoding="utf-8", errors="replace"
+            )
+            if fetch_result.returncode != 0:
+                logging.warning(f"Failed to fetch commit {commit_sha}: {fetch_result.stderr.strip()}")
 
-        # **Try to show commit details**
+        # **Try to show commit details**: author, then the --raw status and --numstat lines of every file
         result = subprocess.run(
-            ["git", "-C", local_repo_path, "show", "--numstat", "--pretty=format:%an", commit_sha],
+            ["git", "-C", local_repo_path, "-c", "core.quotePath=false", "show", *DIFF_OPTIONS,
+             "--pretty=format:%an", commit_sha],
             capture_output=True, text=True, encoding="utf-8", errors="replace"
         )
 
@@ -141,90 +347,15 @@ def fetch_full_commit_data_local(commit_sha, local_repo_path, unique_contributor
         author_name = output[0].strip() if output else "Unknown"
         unique_contributors.add(author_name)
 
-        # **Initialize commit metadata**
-        total_added = total_removed = tests_added = tests_removed = 0
-        src_files = doc_files = other_files = 0
-        file_types = set()
-        file_changes = []
-
-        unique_files_added = set()
-        unique_files_deleted = set()
-        unique_files_modified = set()
-
-        # **Process file changes**
+        # **Process file changes**: the status letter of --raw tells added/deleted/modified apart
+        file_entries = []
+        raw_entries = deque()
         for line in output[1:]:  # Skip author line
-            parts = line.split("\t")
-            if len(parts) != 3:
-                continue  # Skip malformed lines
-
-            added_lines, removed_lines, filename = parts
-            added_lines = int(added_lines) if added_lines.isdigit() else 0
-            removed_lines = int(removed_lines) if removed_lines.isdigit() else 0
-
-            # **Track total added/removed lines**
-            total_added += added_lines
-            total_removed += removed_lines
-
-            # **Get previous commit SHA (parent of current commit)**
-            parent_commit_result = subprocess.run(
-                ["git", "-C", local_repo_path, "rev-parse", f"{commit_sha}^"],
-                capture_output=True, text=True, encoding="utf-8", errors="replace"
-            )
-            parent_commit = parent_commit_result.stdout.strip() if parent_commit_result.returncode == 0 else None
+            entry = parse_change_line(line, raw_entries)
+            if entry:
+                file_entries.append(entry)
 
-            # **Determine file status more accurately**
-            prev_line_count = get_file_line_count(parent_commit, filename, local_repo_path) if parent_commit else None
-            current_line_count = get_file_line_count(commit_sha, filename, local_repo_path)
-
-            if prev_line_count is None and removed_lines > 0:
-                last_known_commit = get_last_commit_containing_file(filename, commit_sha, local_repo_path)
-                prev_line_count = get_file_line_count(last_known_commit, filename, local_repo_path)
-
-            if prev_line_count is None and current_line_count is not None:
-                unique_files_added.add(filename)
-            elif prev_line_count is not None and current_line_count is None:
-                unique_files_deleted.add(filename)
-            else:
-                unique_files_modified.add(filename)
-
-            # **Classify files**
-            if is_test_file(filename):
-                tests_added += added_lines
-                tests_removed += removed_lines
-            elif is_production_file(filename):
-                src_files += 1
-            elif is_documentation_file(filename):
-                doc_files += 1
-            else:
-                other_files += 1
-
-            # **Track file extensions**
-            file_extension = os.path.splitext(filename)[1]
-            if file_extension:
-                file_types.add(file_extension)
-
-            # **Store file change data**
-            file_changes.append({
-                "file_path": filename,
-                "added_lines": added_lines,
-                "removed_lines": removed_lines
-            })
-
-        return {
-            'author': author_name,
-            'total_added': total_added,
-            'total_removed': total_removed,
-            'tests_added': tests_added,
-            'tests_removed': tests_removed,
-            'src_files': src_files,
-            'doc_files': doc_files,
-            'other_files': other_files,
-            'file_types': file_types,
-            'file_changes': file_changes,
-            'gh_files_added': len(unique_files_added),
-            'gh_files_deleted': len(unique_files_deleted),
-            'gh_files_modified': len(unique_files_modified),
-        }
+        return summarize_commit(author_name, file_entries)
 
     except subprocess.CalledProcessError as e:
         logging.error(f"Failed to fetch commit details for {commit_sha}: {e}")
@@ -239,10 +370,36 @@ def fetch_full_commit_data_local(commit_sha, local_repo_path, unique_contributor
 
 
 
-def get_commit_data_local(commit_sha, local_repo_path, until_date, last_end_date, commit_cache, unique_contributors):
+def get_commit_window_local(local_repo_path, until_date, last_end_date):
+    """Commits of a build's window with one `git log` call, when no CommitHistoryIndex is available."""
+    if last_end_date is None:
+        # First build: limit to 10 commits (to mimic API behavior)
+        git_log_command = [
+            "git", "-C", local_repo_path, "log", f"--until={until_date.isoformat()}Z",
+            "-n", "10", "--pretty=format:%H"
+        ]
+    else:
+        # Subsequent builds: get commits between `until_date` and `last_end_date`
+        git_log_command = [
+            "git", "-C", local_repo_path, "log",
+            f"--since={last_end_date.isoformat()}Z", f"--until={until_date.isoformat()}Z",
+            "--pretty=format:%H"
+        ]
+
+    try:
+        result = subprocess.run(git_log_command, capture_output=True, text=True, check=True)
+        return result.stdout.splitlines()
+    except subprocess.CalledProcessError as e:
+        logging.error(f"Error running git log for {local_repo_path}: {e}")
+        return []
+
+
+def get_commit_data_local(commit_sha, local_repo_path, until_date, last_end_date, commit_cache, unique_contributors,
+                          history=None):
     """
     Aggregates commit-related information, ensuring the run's commit_sha is always included,
     along with commits between the last run's end date and this run's creation date.
+    history is the repository's CommitHistoryIndex; without it, git is queried per build.
     """
     # Initialize aggregated metrics
     total_added = total_removed = tests_added = tests_removed = 0
@@ -258,73 +415,49 @@ def get_commit_data_local(commit_sha, local_repo_path, until_date, last_end_date
     commit_shas = [commit_sha]  # Start with the head commit of the run
 
     # **Extract commits in the range**
-    if last_end_date is None:
-        # First build: limit to 10 commits (to mimic API behavior)
-        git_log_command = [
-            "git", "-C", local_repo_path, "log", f"--until={until_date.isoformat()}Z",
-            "-n", "10", "--pretty=format:%H"
-        ]
+    if history is not None and history.loaded:
+        additional_commits = history.commits_between(until_date, last_end_date)
     else:
-        # Subsequent builds: get commits between `until_date` and `last_end_date`
-        git_log_command = [
-            "git", "-C", local_repo_path, "log",
-            f"--since={last_end_date.isoformat()}Z", f"--until={until_date.isoformat()}Z",
-            "--pretty=format:%H"
-        ]
+        additional_commits = get_commit_window_local(local_repo_path, until_date, last_end_date)
 
-    try:
-        result = subprocess.run(git_log_command, capture_output=True, text=True, check=True)
-        additional_commits = result.stdout.splitlines()
-
-        # **Ensure commit_sha is at the beginning of the list**
-        for sha in additional_commits:
-            if sha not in commit_shas:
-                commit_shas.append(sha)
-
-    except subprocess.CalledProcessError as e:
-        logging.error(f"Error running git log for {local_repo_path}: {e}")
+    # **Ensure commit_sha is at the beginning of the list**
+    for sha in additional_commits:
+        if sha not in commit_shas:
+            commit_shas.append(sha)
 
     # **Process each commit, ensuring commit_sha is processed first**
     for sha in commit_shas:
         # Check cache to avoid redundant calls
-        cached_data = commit_cache.get(sha)
-        if cached_data:
-            total_added += cached_data['total_added']
-            total_removed += cached_data['total_removed']
-            tests_added += cached_data['tests_added']
-            tests_removed += cached_data['tests_removed']
-            src_files += cached_data['src_files']
-            doc_files += cached_data['doc_files']
-            other_files += cached_data['other_files']
-            file_types.update(cached_data['file_types'])
-            commits_on_files_touched.add(sha)
-
-            unique_files_added += cached_data['gh_files_added']
-            unique_files_deleted += cached_data['gh_files_deleted']
-            unique_files_modified += cached_data['gh_files_modified']
-
-            continue  # Skip redundant processing
-
-        # **Get detailed file changes for this commit**
-        commit_full_data = fetch_full_commit_data_local(sha, local_repo_path, unique_contributors)
-        if commit_full_data:
-            commits_on_files_touched.add(sha)
-            total_added += commit_full_data['total_added']
-            total_removed += commit_full_data['total_removed']
-            tests_added += commit_full_data['tests_added']
-            tests_removed += commit_full_data['tests_removed']
-            src_files += commit_full_data['src_files']
-            doc_files += commit_full_data['doc_files']
-            other_files += commit_full_data['other_files']
-            file_types.update(commit_full_data['file_types'])
-
-            # Aggregate unique file changes
-            unique_files_added += commit_full_data['gh_files_added']
-            unique_files_deleted += commit_full_data['gh_files_deleted']
-            unique_files_modified += commit_full_data['gh_files_modified']
-
+        commit_data = commit_cache.get(sha)
+        if commit_data:
+            unique_contributors.add(commit_data['author'])  # May have been analysed by a CommitAnalysisPool
+        else:
+            # **Get detailed file changes for this commit**
+            if history is not None and sha in history:
+                commit_data = history.commit_data(sha)
+                unique_contributors.add(commit_data['author'])
+            else:
+                # Not reachable from the default branch (e.g. a pull request commit): ask git
+                commit_data = fetch_full_commit_data_local(sha, local_repo_path, unique_contributors)
+            if not commit_data:
+                continue
             # Cache the commit data for efficiency
-            commit_cache.put(sha, commit_full_data)
+            commit_cache.put(sha, commit_data)
+
+        commits_on_files_touched.add(sha)
+        total_added += commit_data['total_added']
+        total_removed += commit_data['total_removed']
+        tests_added += commit_data['tests_added']
+        tests_removed += commit_data['tests_removed']
+        src_files += commit_data['src_files']
+        doc_files += commit_data['doc_files']
+        other_files += commit_data['other_files']
+        file_types.update(commit_data['file_types'])
+
+        # Aggregate unique file changes
+        unique_files_added += commit_data['gh_files_added']
+        unique_files_deleted += commit_data['gh_files_deleted']
+        unique_files_modified += commit_data['gh_files_modified']
 
     # **Return aggregated commit data**
     return {
@@ -344,3 +477,54 @@ def get_commit_data_local(commit_sha, local_repo_path, until_date, last_end_date
         'gh_test_lines_per_kloc': (tests_added + tests_removed) / max((total_added + total_removed) / 1000, 1),
         'file_types': list(file_types)
     }
+
+
+def analyze_commit_batch(local_repo_path, commit_shas):
+    """Process pool task: metrics of a batch of commits read with git show, keyed by SHA."""
+    results = {}
+    for sha in commit_shas:
+        commit_data = fetch_full_commit_data_local(sha, local_repo_path, set())
+        if commit_data:
+            results[sha] = commit_data
+    return results
+
+
+class CommitAnalysisPool:
+    """
+    Analyses the commits needed by a batch of runs that are missing from the history index
+    (one git show each) across worker processes, against the shared local clone, and fills
+    the commit cache before the builds reach the git stage. Indexed commits are left to the
+    git stage, summarizing them costs less than sending them to a worker.
+    """
+
+    def __init__(self, local_repo_path, history, workers, chunk_size=32):
+        self.local_repo_path = local_repo_path
+        self.history = history
+        self.chunk_size = chunk_size
+        # Spawned, not forked: the crawl's pipeline threads are already running
+        self.executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+
+    def prefetch(self, commit_shas, commit_cache):
+        """Analyse the commits missing from the history index and commit_cache, and cache them; returns how many."""
+        tasks = []
+        for sha in dict.fromkeys(commit_shas):  # Drop duplicates, keep order
+            if (self.history is not None and sha in self.history) or commit_cache.get(sha):
+                continue
+            tasks.append(sha)
+
+        futures = [self.executor.submit(analyze_commit_batch, self.local_repo_path, tasks[i:i + self.chunk_size])
+                   for i in range(0, len(tasks), self.chunk_size)]
+        analysed = 0
+        for future in as_completed(futures):
+            try:
+                results = future.result()
+            except Exception as e:
+                logging.error(f"Commit analysis worker failed for {self.local_repo_path}: {e}")
+                continue  # The git stage analyses these commits itself
+            for sha, commit_data in results.items():
+                commit_cache.put(sha, commit_data)
+            analysed += len(results)
+        return analysed
+
+    def close(self):
+        self.executor.shutdown()
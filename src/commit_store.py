@@ -0,0 +1,87 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+
+
+class CommitMetricsStore:
+    """
+    Persistent per-commit metrics (the output of summarize_commit) keyed by (repo, sha),
+    shared by every crawl and every worker process. Each row records the version of the
+    file classification code it was computed with; rows of another version are stale and
+    purged when the store is opened, so changing the classifiers recomputes the metrics.
+    """
+
+    def __init__(self, db_path, version, timeout=60):
+        self.db_path = db_path
+        self.version = version
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._connection = sqlite3.connect(db_path, timeout=timeout, check_same_thread=False)
+        self._connection.execute('PRAGMA journal_mode=WAL')  # Concurrent readers while a worker writes
+        self._connection.execute('PRAGMA synchronous=NORMAL')
+        with self._connection:
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS commits '
+                '(repo TEXT, sha TEXT, version TEXT, data TEXT, PRIMARY KEY (repo, sha))')
+            purged = self._connection.execute('DELETE FROM commits WHERE version != ?', (version,)).rowcount
+        if purged:
+            logging.info(f"Purged {purged} commit(s) analysed by an older classifier from {db_path}")
+
+    def get(self, repo, sha):
+        with self._lock:
+            row = self._connection.execute('SELECT data FROM commits WHERE repo = ? AND sha = ? AND version = ?',
+                                           (repo, sha, self.version)).fetchone()
+        if row is None:
+            return None
+        commit_data = json.loads(row[0])
+        commit_data['file_types'] = set(commit_data['file_types'])
+        return commit_data
+
+    def put(self, repo, sha, commit_data):
+        data = json.dumps(dict(commit_data, file_types=sorted(commit_data['file_types'])))
+        with self._lock, self._connection:
+            self._connection.execute('INSERT OR REPLACE INTO commits (repo, sha, version, data) VALUES (?, ?, ?, ?)',
+                                     (repo, sha, self.version, data))
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+
+class PersistentCommitCache:
+    """
+    Commit cache of one repository (the get/put interface of get_commit_data_local): an
+    in-memory cache in front of a CommitMetricsStore, so a commit is analysed once, ever.
+    """
+
+    def __init__(self, store, repo_full_name, memory_cache):
+        self.store = store
+        self.repo_full_name = repo_full_name
+        self.memory_cache = memory_cache
+
+    def get(self, sha):
+        commit_data = self.memory_cache.get(sha)
+        if commit_data is None:
+            commit_data = self.store.get(self.repo_full_name, sha)
+            if commit_data is not None:
+                self.memory_cache.put(sha, commit_data)
+        return commit_data
+
+    def put(self, sha, commit_data):
+        self.memory_cache.put(sha, commit_data)
+        self.store.put(self.repo_full_name, sha, commit_data)
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_commit_store(db_path, version):
+    """Return the process-wide CommitMetricsStore of a database."""
+    key = (os.path.abspath(db_path), version)
+    with _stores_lock:
+        if key not in _stores:
+            _stores[key] = CommitMetricsStore(db_path, version)
+        return _stores[key]
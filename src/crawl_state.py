@@ -0,0 +1,82 @@
+import json
+import logging
+import os
+import threading
+
+
+class RepoCrawlState:
+    """
+    Persistent crawl state of one repository, kept in its own JSON file under state_dir
+    so that parallel workers (one repository each) never write the same file.
+    Holds the per-workflow high-water marks (the newest run ID fully processed) and the
+    resume checkpoint: the listing position (workflow, page, creation window) of the
+    oldest discovered run that has not been written yet, plus the last run written.
+    """
+
+    def __init__(self, state_dir, repo_full_name):
+        os.makedirs(state_dir, exist_ok=True)
+        self.path = os.path.join(state_dir, f"{repo_full_name.replace('/', '__')}.json")
+        self._lock = threading.Lock()
+        self.data = {'repo': repo_full_name, 'high_water_marks': {}, 'checkpoint': None}
+        self._pending = {}  # ticket -> listing position of runs still in the pipeline
+        self._next_ticket = 0
+        self._latest_position = None
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, 'r', encoding='utf-8') as file:
+                    self.data.update(json.load(file))
+            except (OSError, ValueError) as e:
+                logging.error(f"Ignoring unreadable crawl state {self.path}: {e}")
+
+    def save(self):
+        tmp_path = f"{self.path}.tmp"
+        with self._lock:
+            with open(tmp_path, 'w', encoding='utf-8') as file:
+                json.dump(self.data, file, indent=2)
+            os.replace(tmp_path, self.path)  # Atomic, a crash never leaves a truncated state file
+
+    def checkpoint(self):
+        """Position to resume listing from after an interrupted crawl, or None."""
+        return self.data.get('checkpoint')
+
+    def register(self, position):
+        """Record the listing position of a run entering the pipeline; returns a ticket for done()."""
+        with self._lock:
+            self._next_ticket += 1
+            self._pending[self._next_ticket] = position
+            return self._next_ticket
+
+    def advance(self, position):
+        """Record the next page to list; becomes the checkpoint once no run is pending."""
+        with self._lock:
+            self._latest_position = position
+            if self._pending:
+                return
+            self.data['checkpoint'] = dict(position, last_run_id=(self.data['checkpoint'] or {}).get('last_run_id'))
+        self.save()
+
+    def done(self, ticket, run_id=None):
+        """A run left the pipeline (written, or dropped when run_id is None): move the checkpoint."""
+        with self._lock:
+            self._pending.pop(ticket, None)
+            last_run_id = run_id or (self.data['checkpoint'] or {}).get('last_run_id')
+            # Tickets are increasing, so the first pending one is the oldest unwritten run
+            position = next(iter(self._pending.values()), None) or self._latest_position
+            if position is not None:
+                self.data['checkpoint'] = dict(position, last_run_id=last_run_id)
+        self.save()
+
+    def clear_checkpoint(self):
+        with self._lock:
+            self.data['checkpoint'] = None
+            self._pending.clear()
+            self._latest_position = None
+
+    def high_water_mark(self, workflow_id):
+        """Newest run ID already processed for a workflow, or 0."""
+        return int(self.data['high_water_marks'].get(str(workflow_id), 0))
+
+    def raise_high_water_mark(self, workflow_id, run_id):
+        with self._lock:
+            marks = self.data['high_water_marks']
+            marks[str(workflow_id)] = max(int(marks.get(str(workflow_id), 0)), int(run_id))
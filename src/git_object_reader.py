@@ -0,0 +1,75 @@
+import logging
+import os
+import subprocess
+import threading
+
+
+class GitObjectReader:
+    """
+    Long-lived `git cat-file --batch-check` process of one clone. Object lookups are
+    streamed through its pipes instead of spawning a git process per lookup.
+    """
+
+    def __init__(self, local_repo_path):
+        self.local_repo_path = local_repo_path
+        self._process = None
+        self._lock = threading.Lock()
+
+    def _get_process(self):
+        if self._process is None or self._process.poll() is not None:
+            self._process = subprocess.Popen(["git", "-C", self.local_repo_path, "cat-file", "--batch-check"],
+                                             stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        return self._process
+
+    def info(self, rev):
+        """(sha, type, size) of an object ("<sha>", "<sha>:<path>", ...), or None if it does not exist."""
+        if '\n' in rev:
+            return None  # Cannot be sent over the line-based protocol
+        with self._lock:
+            process = self._get_process()
+            try:
+                process.stdin.write(rev.encode('utf-8') + b'\n')
+                process.stdin.flush()
+                header = process.stdout.readline().split()
+            except (BrokenPipeError, OSError) as e:
+                logging.error(f"git cat-file --batch-check failed in {self.local_repo_path}: {e}")
+                self._process = None
+                return None
+        # "<rev> missing" or "<rev> ambiguous" echo the rev, which may itself contain spaces
+        if len(header) != 3 or header[-1] in (b'missing', b'ambiguous'):
+            return None
+        return header[0].decode(), header[1].decode(), int(header[2])
+
+    def exists(self, rev):
+        return self.info(rev) is not None
+
+    def close(self):
+        with self._lock:
+            if self._process is not None:
+                try:
+                    self._process.stdin.close()  # git exits at the end of its input
+                    self._process.wait(timeout=10)
+                except (OSError, subprocess.TimeoutExpired):
+                    self._process.kill()
+                self._process = None
+
+
+_readers = {}
+_readers_lock = threading.Lock()
+
+
+def get_object_reader(local_repo_path):
+    """Return the process-wide GitObjectReader of a clone."""
+    key = os.path.abspath(local_repo_path)
+    with _readers_lock:
+        if key not in _readers:
+            _readers[key] = GitObjectReader(local_repo_path)
+        return _readers[key]
+
+
+def close_object_reader(local_repo_path):
+    """Stop the git process of a clone, before it is deleted."""
+    with _readers_lock:
+        reader = _readers.pop(os.path.abspath(local_repo_path), None)
+    if reader is not None:
+        reader.close()
@@ -1,7 +1,11 @@
 import re
 import requests
 import base64
-from request_github import get_request
+import io
+import tempfile
+from request_github import get_request, get_client
+from metrics_cache import get_metrics_cache
+from patterns import bytes_regex
 import logging
 
 import re
@@ -37,50 +41,54 @@ import time
 import requests
 import logging
 
-def get_github_actions_log(repo_full_name, run_id, token=None, max_retries=3):
+log_spool_settings = {'max_memory': 16 * 1024 * 1024, 'chunk_size': 1024 * 1024}
+
+
+def configure_log_spooling(max_memory):
+    """Set how many bytes of a downloaded log archive stay in memory before it spills to disk."""
+    log_spool_settings['max_memory'] = max_memory
+
+
+def get_github_actions_log(repo_full_name, run_id, token=None):
     """
     Fetch the logs for a specific GitHub Actions workflow run.
-    Handles binary (ZIP) responses correctly and retries on rate limits.
+    The ZIP archive is streamed in chunks into memory, and moved to a temporary file once it
+    outgrows log_spool_settings['max_memory']: returns that file, rewound, or None.
+    The caller closes it. Retries and rate limits are handled by the shared client.
     """
     url = f"https://api.github.com/repos/{repo_full_name}/actions/runs/{run_id}/logs"
-    headers = {"Authorization": f"token {token}"} if token else {}
 
-    retries = 0  # Track retries
+    response = get_client().request(url, token, stream=True)  # Use raw binary stream
 
-    while retries < max_retries:
+    if response is None:
+        logging.error(f"Failed to fetch logs for run {run_id} in {repo_full_name}")
+        return None
+
+    if response.status_code == 200:
+        # Not a SpooledTemporaryFile: zipfile needs seekable(), which it only has since Python 3.11
+        spool = io.BytesIO()
         try:
-            response = requests.get(url, headers=headers, stream=True)  # Use raw binary stream
-            
-            if response.status_code == 200:
-                return response.content  # Return raw binary log data
-            
-            elif response.status_code == 403:  # Rate limit exceeded
-                rate_limit_reset = response.headers.get("X-RateLimit-Reset")
-                if rate_limit_reset:
-                    wait_time = int(rate_limit_reset) - int(time.time()) + 1  # Ensure at least 1s wait
-                    logging.warning(f"GitHub API rate limit exceeded. Sleeping for {wait_time} seconds...")
-                    time.sleep(wait_time)  # Sleep until the rate limit resets
-                else:
-                    logging.warning("GitHub API rate limit hit but no reset time provided. Sleeping for 60s.")
-                    #time.sleep(1)  # Default sleep time before retrying
-                
-            elif response.status_code == 404:
-                logging.error(f"Logs for build {run_id} in {repo_full_name} were not found. They may have expired.")
-                return None  # No point retrying if logs don't exist
-            
-            else:
-                logging.error(f"Failed to fetch logs for run {run_id} in {repo_full_name}, Status: {response.status_code}")
-                return None  # Other errors should not be retried
-            
-        except requests.exceptions.RequestException as err:
-            logging.error(f"Unexpected error fetching logs for run {run_id} in {repo_full_name}: {err}")
-        
-        retries += 1
-        logging.warning(f"Retrying log fetch for {repo_full_name}, run {run_id} (attempt {retries}/{max_retries})")
-        time.sleep(5)  # Short delay before retrying
-
-    logging.error(f"Failed to fetch logs after {max_retries} retries for run {run_id} in {repo_full_name}")
-    return None  # Return None if all retries fail
+            for chunk in response.iter_content(chunk_size=log_spool_settings['chunk_size']):
+                if isinstance(spool, io.BytesIO) and spool.tell() + len(chunk) > log_spool_settings['max_memory']:
+                    disk_file = tempfile.TemporaryFile(suffix='.zip')  # Deleted when closed
+                    disk_file.write(spool.getvalue())
+                    spool = disk_file
+                spool.write(chunk)
+        except Exception as e:
+            logging.error(f"Failed to download logs for run {run_id} in {repo_full_name}: {e}")
+            spool.close()
+            return None
+        finally:
+            response.close()
+        spool.seek(0)
+        return spool
+
+    elif response.status_code in (404, 410):
+        logging.error(f"Logs for build {run_id} in {repo_full_name} were not found. They may have expired.")
+    else:
+        logging.error(f"Failed to fetch logs for run {run_id} in {repo_full_name}, Status: {response.status_code}")
+    response.close()
+    return None
 
 
     
@@ -91,11 +99,17 @@ def get_file_content(owner, repo, path, token=None):
     Includes explicit error handling.
     """
     url = f"https://api.github.com/repos/{owner}/{repo}/contents/{path}"
+    cache_key = (f"{owner}/{repo}", path, None)  # Default branch
+    content = get_metrics_cache().get('file_content', cache_key)
+    if content is not None:
+        return content
 
     try:
         response = get_request(url, token)
         if response and 'content' in response:
-            return base64.b64decode(response['content']).decode('utf-8')
+            content = base64.b64decode(response['content']).decode('utf-8')
+            get_metrics_cache().put('file_content', cache_key, content, ttl=3600)
+            return content
         else:
             logging.error(f"Failed to fetch file content for {path} in {owner}/{repo}")
             return None
@@ -122,10 +136,22 @@ def summarize_test_results(test_results):
 
 
 
-def identify_test_frameworks(files, owner, repo, token=None):
+BUILD_FILES = ('pom.xml', 'build.gradle', 'Gemfile', 'Rakefile', 'composer.json', 'requirements.txt', 'setup.py',
+               'pyproject.toml', 'package.json')
+
+
+def fetch_build_files(files, owner, repo, token=None):
+    """Contents of the root build files of a repository, each fetched once (None if unreadable)."""
+    return {path: get_file_content(owner, repo, path, token) for path in BUILD_FILES if path in files}
+
+
+def identify_test_frameworks(files, owner, repo, token=None, contents=None):
     """
     Identify the test frameworks based on the presence of specific dependencies in build files.
+    contents holds already fetched build files (see fetch_build_files).
     """
+    if contents is None:
+        contents = fetch_build_files(files, owner, repo, token)
     test_framework_mapping = {
         'junit': ['pom.xml', 'build.gradle'],
         'rspec': ['Gemfile', 'Rakefile'],
@@ -155,16 +181,9 @@ def identify_test_frameworks(files, owner, repo, token=None):
 
     for framework, paths in test_framework_mapping.items():
         for path in paths:
-            if path in files:
-                try:
-                    content = get_file_content(owner, repo, path, token)
-                    #print("content is : " , content)
-                    #print("Framework: ", framework)
-                    # print("Content: ", content)
-                    if framework_dependencies[framework].search(content):
-                        frameworks_found.append(framework)
-                except Exception as e:
-                    continue
+            content = contents.get(path)
+            if content and framework_dependencies[framework].search(content):
+                frameworks_found.append(framework)
 
     return frameworks_found
 
@@ -174,15 +193,15 @@ def identify_test_frameworks_and_count_dependencies(files, owner, repo, token=No
     """
     Identify test frameworks and count dependencies based on the presence of specific dependencies in build files.
     """
-    test_frameworks = identify_test_frameworks(files, owner, repo, token)
+    contents = fetch_build_files(files, owner, repo, token)  # Shared by both analyses
+    test_frameworks = identify_test_frameworks(files, owner, repo, token, contents=contents)
     dependency_count = 0
 
     for file in files:
         # Check if the file is a recognized dependency file
         if file in ['pom.xml', 'build.gradle', 'requirements.txt', 'Gemfile', 'package.json', 'composer.json']:
             try:
-                # Fetch the content of the dependency file
-                content = get_file_content(owner, repo, file, token)
+                content = contents[file]
                 # Count dependencies in this file
                 dependency_count += count_dependencies(content, file)
             except Exception as e:
@@ -218,112 +237,281 @@ def identify_build_language(files):
 
 
 
-def remove_ansi_escape_sequences(text):
-    ansi_escape = re.compile(r'\x1B\[[0-?]*[ -/]*[@-~]')
-    return ansi_escape.sub('', text)
+ANSI_ESCAPE_BYTES = re.compile(rb'\x1B\[[0-?]*[ -/]*[@-~]')
+
+# Literal text found in every match of a framework's pattern: lines without any are not matched
+FRAMEWORK_KEYWORDS = {
+    "pytest": ("passed", "failed", "skipped"),
+    "Jest": ("Tests",),
+    "junit-gradle": ("Passed",),
+    "rspec": ("example",),
+    "PHPUnit": ("Assertions",),
+    "NUnit": ("Total tests",),
+    "Go test": ("PASS",),
+    "junit-maven": ("Tests run",),
+    "cucumber-ruby": ("scenario",),
+    "Cucumber-Java": ("Tests run",),
+    "testunit": ("assertions",),
+}
+
+# Patterns spanning several lines, matched over a window of lines starting at a keyword line
+MULTILINE_FRAMEWORKS = {"cucumber-ruby": "step"}  # framework -> keyword of the window's last line
+MULTILINE_WINDOW = 20
+
+# Loose patterns (pytest's "N passed") also match other frameworks' summaries: they only
+# run on lines that no other framework matched
+FALLBACK_FRAMEWORKS = {"pytest"}
+
+
+def accumulate_matches(framework, matches):
+    """Add up the test counts of a framework's regex matches."""
+    passed_tests = 0
+    failed_tests = 0
+    skipped_tests = 0
+    errors_tests = 0
+
+    for match in matches:
+        if framework == "pytest":
+            if match[0]:
+                passed_tests += int(match[0])
+            if match[1]:
+                failed_tests += int(match[1])
+            if match[2]:
+                skipped_tests += int(match[2])
+        elif framework == "junit-gradle":
+            passed_tests += int(match[0])
+            failed_tests += int(match[1])
+            errors_tests += int(match[2])  # Count errors for JUnit
+            skipped_tests += int(match[3])
+
+        elif framework == "junit-maven":
+            passed_tests += int(match[0]) - int(match[1]) - int(match[2]) - int(
+                match[3])  # Subtract failed, errors, and skipped
+            failed_tests += int(match[1])
+            errors_tests += int(match[2])  # Count errors for JUnit
+            skipped_tests += int(match[3])
+
+
+        elif framework == "rspec":
+            if match[0]:
+                passed_tests += int(match[0])
+            if match[1]:
+                failed_tests += int(match[1])
+                passed_tests -= int(match[1])  # Subtract failed tests from passed
+            if match[2]:
+                skipped_tests += int(match[2])
+                passed_tests -= int(match[2])  # Subtract skipped tests from passed
+        elif framework == "cucumber-ruby":
+            scenarios_skipped = int(match[1].split()[0]) if match[1] else 0
+            scenarios_undefined = int(match[2].split()[0]) if match[2] else 0
+            scenarios_failed = int(match[3].split()[0]) if match[3] else 0
+            scenarios_passed = int(match[4].split()[0]) if match[4] else 0
+            steps_skipped = int(match[6].split()[0]) if match[6] else 0
+            steps_undefined = int(match[7].split()[0]) if match[7] else 0
+            steps_failed = int(match[8].split()[0]) if match[8] else 0
+            steps_passed = int(match[9].split()[0]) if match[9] else 0
+
+            passed_tests += scenarios_passed + steps_passed
+            failed_tests += scenarios_failed + steps_failed
+            skipped_tests += scenarios_skipped + steps_skipped
+            # undefined_tests += scenarios_undefined + steps_undefined
+            # No skipped or errors for this format
+            # No errors for this format
+        elif framework == "Cucumber-Java":
+            passed_tests += int(match[0])
+            failed_tests += int(match[1])
+            errors_tests += int(match[2])
+            skipped_tests += int(match[3])
+        elif framework == "Jest":
+            # Total comes first
+            passed_tests += int(match[1])
+            failed_tests += int(match[2])
+            skipped_tests += int(match[3])
+        elif framework == "PHPUnit":
+            # Tests, assertions, failures, skipped
+            passed_tests += int(match[0]) - int(match[2]) - int(match[3])
+            failed_tests += int(match[2])
+            skipped_tests += int(match[3])
+        elif framework == "NUnit":
+            # Total comes first
+            passed_tests += int(match[1])
+            failed_tests += int(match[2])
+            skipped_tests += int(match[3])
+        elif framework == "Go test":
+            passed_tests += int(match[0])
+            failed_tests += int(match[1])
+            skipped_tests += int(match[2])
+        elif framework == "testunit":
+            passed_tests += int(match[0])
+            # assertions += int(match[1])
+            failed_tests += int(match[2])
+            errors_tests += int(match[3])
+            # pendings, omissions, and notifications are not being counted in total
+
+    total_tests = passed_tests + failed_tests + skipped_tests + errors_tests
+
+    return {
+        'passed': passed_tests,
+        'failed': failed_tests,
+        'skipped': skipped_tests,
+        'total': total_tests
+    }
+
 
+def add_test_results(cumulative_test_results, test_results):
+    for key in ('passed', 'failed', 'skipped', 'total'):
+        cumulative_test_results[key] += test_results[key]
 
-def parse_test_results(framework, log_content, build_language , framework_regex):
+
+def find_matches(regex, text):
+    """findall, without the empty matches of patterns made only of optional groups (pytest)."""
+    return [match for match in regex.findall(text) if any(match)]
+
+
+def scan_plan(framework_regex):
     """
-    Parse the test results from the log content.
+    (framework, regex, keywords, closing keyword) of every distinct pattern, all as bytes.
+    Identical patterns (junit-maven and Cucumber-Java) are evaluated once, under the first
+    framework name.
     """
-    log_content = remove_ansi_escape_sequences(log_content)  # Remove ANSI escape codes
-    if framework == "junit" and build_language == "java-maven":
-        framework = "junit-maven"
-    if framework == "junit" and build_language == "java-gradle":
-        framework = "junit-gradle"
-
-    if framework in framework_regex:
-        #print("Framework: ", framework)
-        #print("Build Language: ", build_language)
-
-        # special case for junit-java and junit-maven
-        if framework == "junit" and build_language == "java-maven":
-            regex = framework_regex["junit-maven"]
-            matches = regex.findall(log_content)
-        elif framework == "junit" and build_language == "java-gradle":
-            regex = framework_regex["junit-java"]
-            matches = regex.findall(log_content)
-        else:
-            regex = framework_regex[framework]
-            matches = regex.findall(log_content)
-
-        # Debug statements
-        # print("Log content: ", log_content)
-        # print("Matches found: ", matches)
-
-        if matches:
-            passed_tests = 0
-            failed_tests = 0
-            skipped_tests = 0
-            errors_tests = 0
-
-            for match in matches:
-                if framework == "pytest":
-                    if match[0]:
-                        passed_tests += int(match[0])
-                    if match[1]:
-                        failed_tests += int(match[1])
-                    if match[2]:
-                        skipped_tests += int(match[2])
-                elif framework == "junit-gradle":
-                    passed_tests += int(match[0])
-                    failed_tests += int(match[1])
-                    errors_tests += int(match[2])  # Count errors for JUnit
-                    skipped_tests += int(match[3])
-
-                elif framework == "junit-maven":
-                    passed_tests += int(match[0]) - int(match[1]) - int(match[2]) - int(
-                        match[3])  # Subtract failed, errors, and skipped
-                    failed_tests += int(match[1])
-                    errors_tests += int(match[2])  # Count errors for JUnit
-                    skipped_tests += int(match[3])
-
-
-                elif framework == "rspec":
-                    if match[0]:
-                        passed_tests += int(match[0])
-                    if match[1]:
-                        failed_tests += int(match[1])
-                        passed_tests -= int(match[1])  # Subtract failed tests from passed
-                    if match[2]:
-                        skipped_tests += int(match[2])
-                        passed_tests -= int(match[2])  # Subtract skipped tests from passed
-                elif framework == "cucumber-ruby":
-                    scenarios_skipped = int(match[1].split()[0]) if match[1] else 0
-                    scenarios_undefined = int(match[2].split()[0]) if match[2] else 0
-                    scenarios_failed = int(match[3].split()[0]) if match[3] else 0
-                    scenarios_passed = int(match[4].split()[0]) if match[4] else 0
-                    steps_skipped = int(match[6].split()[0]) if match[6] else 0
-                    steps_undefined = int(match[7].split()[0]) if match[7] else 0
-                    steps_failed = int(match[8].split()[0]) if match[8] else 0
-                    steps_passed = int(match[9].split()[0]) if match[9] else 0
-
-                    passed_tests += scenarios_passed + steps_passed
-                    failed_tests += scenarios_failed + steps_failed
-                    skipped_tests += scenarios_skipped + steps_skipped
-                    # undefined_tests += scenarios_undefined + steps_undefined
-                    # No skipped or errors for this format
-                    # No errors for this format
-                elif framework == "Cucumber-Java":
-                    passed_tests += int(match[0])
-                    failed_tests += int(match[1])
-                    errors_tests += int(match[2])
-                    skipped_tests += int(match[3])
-                elif framework == "testunit":
-                    passed_tests += int(match[0])
-                    # assertions += int(match[1])
-                    failed_tests += int(match[2])
-                    errors_tests += int(match[3])
-                    # pendings, omissions, and notifications are not being counted in total
-
-            total_tests = passed_tests + failed_tests + skipped_tests + errors_tests
-
-            return {
-                'passed': passed_tests,
-                'failed': failed_tests,
-                'skipped': skipped_tests,
-                'total': total_tests
-            }
-
-    return {'passed': 0, 'failed': 0, 'skipped': 0, 'total': 0}
+    plan = []
+    patterns = set()
+    for framework, regex in framework_regex.items():
+        regex = bytes_regex(regex)
+        if regex.pattern not in patterns:
+            patterns.add(regex.pattern)
+            keywords = tuple(keyword.encode() for keyword in FRAMEWORK_KEYWORDS.get(framework, ()))
+            closing_keyword = MULTILINE_FRAMEWORKS[framework].encode() if framework in MULTILINE_FRAMEWORKS else None
+            plan.append((framework, regex, keywords, closing_keyword))
+    return plan
+
+
+def keyword_lines(buffer, plan):
+    """
+    (line number, line) of the lines of a buffer holding a keyword of the plan, found by a
+    single regex search over the whole buffer; every line if a pattern has no keywords.
+    """
+    keywords = set()
+    for _, _, pattern_keywords, closing_keyword in plan:
+        if not pattern_keywords:
+            keywords = None
+            break
+        keywords.update(pattern_keywords)
+        if closing_keyword:
+            keywords.add(closing_keyword)
+    search = re.compile(b'|'.join(re.escape(keyword) for keyword in sorted(keywords))
+                        if keywords is not None else b'^', re.MULTILINE)
+
+    line_number = 0
+    counted = 0  # Offset up to which newlines are counted
+    line_end = -1
+    for match in search.finditer(buffer):
+        if match.start() <= line_end:
+            continue  # Another keyword of a line already yielded
+        line_start = buffer.rfind(b'\n', 0, match.start()) + 1
+        line_end = buffer.find(b'\n', match.start())
+        if line_end == -1:
+            line_end = len(buffer)
+        line_number += buffer[counted:line_start].count(b'\n')
+        counted = line_start
+        yield line_number, buffer[line_start:line_end]
+
+
+def scan_lines(lines, plan, window=MULTILINE_WINDOW):
+    """
+    Test results of the (line number, line) pairs of a log: {framework: {'passed', 'failed',
+    'skipped', 'total'}} for the frameworks found. Lines without any keyword of the plan may
+    be left out. Patterns are only run on lines holding one of their keywords, after the
+    ANSI codes are stripped. Multi-line patterns run over a window of up to `window` lines,
+    from a keyword line to the line holding the closing keyword; fallback patterns run on
+    the lines no other pattern matched.
+    """
+    line_plan = [step for step in plan if step[0] not in MULTILINE_FRAMEWORKS and step[0] not in FALLBACK_FRAMEWORKS]
+    window_plan = [step for step in plan if step[0] in MULTILINE_FRAMEWORKS]
+    fallback_plan = [step for step in plan if step[0] in FALLBACK_FRAMEWORKS]
+    matches = {}
+    windows = {}  # framework -> (number of its first line, its lines)
+    unclaimed = []  # (line, window frameworks it belongs to) waiting for the fallback patterns
+
+    def close_window(framework, regex):
+        found = find_matches(regex, b'\n'.join(windows.pop(framework)[1]))
+        if found:
+            matches.setdefault(framework, []).extend(found)
+        # Lines of a matched window belong to it; the others may still be fallback matches
+        for index in range(len(unclaimed) - 1, -1, -1):
+            line, owners = unclaimed[index]
+            if framework in owners:
+                owners.discard(framework)
+                if found:
+                    del unclaimed[index]
+
+    def flush_unclaimed():
+        while unclaimed and not unclaimed[0][1]:  # Not inside any open window anymore
+            run_fallback(unclaimed.pop(0)[0])
+
+    def run_fallback(log_content):
+        for framework, regex, keywords, _ in fallback_plan:
+            if keywords and not any(keyword in log_content for keyword in keywords):
+                continue
+            found = find_matches(regex, log_content)
+            if found:
+                matches.setdefault(framework, []).extend(found)
+
+    for line_number, line in lines:
+        for framework, regex, _, _ in window_plan:
+            if framework in windows and line_number - windows[framework][0] >= window:
+                close_window(framework, regex)
+        flush_unclaimed()
+
+        log_content = None
+        claimed = False
+
+        for framework, regex, keywords, _ in line_plan:
+            if keywords and not any(keyword in line for keyword in keywords):
+                continue
+            if log_content is None:
+                log_content = ANSI_ESCAPE_BYTES.sub(b'', line).strip()
+            found = find_matches(regex, log_content)
+            if found:
+                matches.setdefault(framework, []).extend(found)
+                claimed = True
+
+        owners = set()
+        for framework, regex, keywords, closing_keyword in window_plan:
+            if framework not in windows:
+                if keywords and not any(keyword in line for keyword in keywords):
+                    continue
+                windows[framework] = (line_number, [])
+            if log_content is None:
+                log_content = ANSI_ESCAPE_BYTES.sub(b'', line).strip()
+            windows[framework][1].append(log_content)
+            owners.add(framework)
+            if closing_keyword in line:
+                if not claimed:
+                    unclaimed.append((log_content, owners))
+                    claimed = True  # Queued once, whatever the window decides
+                close_window(framework, regex)
+
+        if not claimed and fallback_plan:
+            if log_content is None:
+                log_content = ANSI_ESCAPE_BYTES.sub(b'', line).strip()
+            unclaimed.append((log_content, owners))
+        flush_unclaimed()
+
+    for framework, regex, _, _ in window_plan:
+        if framework in windows:
+            close_window(framework, regex)
+    flush_unclaimed()
+
+    # Only the matched groups are decoded, by int()
+    return {framework: accumulate_matches(framework, found) for framework, found in matches.items()}
+
+
+def scan_log_buffer(buffer, framework_regex, window=MULTILINE_WINDOW):
+    """
+    Test results of one log member held in a bytes-like buffer (typically a memory-mapped
+    file) for every framework pattern. The buffer is never decoded: its keyword lines are
+    located by one search over the buffer and matched as bytes.
+    """
+    plan = scan_plan(framework_regex)
+    return scan_lines(keyword_lines(buffer, plan), plan, window)
@@ -0,0 +1,130 @@
+import logging
+import mmap
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from log_parser import scan_log_buffer, log_spool_settings
+
+LOG_PARSING_MODES = ('inline', 'process')
+
+
+class LogParsingError(Exception):
+    """Some members of a log archive could not be scanned: its test results would be incomplete."""
+
+
+def scan_log_file(path, framework_regex):
+    """Scan a log member extracted to disk, memory-mapped rather than read (also the process pool task)."""
+    with open(path, 'rb') as log_file:
+        if os.fstat(log_file.fileno()).st_size == 0:
+            return {}  # Empty files cannot be mapped
+        with mmap.mmap(log_file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            return scan_log_buffer(buffer, framework_regex)
+
+
+class LogParsingExecutor:
+    """
+    Runs the test result scan of run log archives. In 'inline' mode the members are scanned
+    by the calling thread: read into memory when they fit under the log memory ceiling (see
+    configure_log_spooling), otherwise extracted to temporary files and scanned memory-mapped.
+    In 'process' mode each member is extracted and scanned by a process pool shared by every
+    build, so regex work is not bound to the one core the crawl threads share.
+    """
+
+    def __init__(self, mode='inline', workers=None):
+        self.mode = mode
+        self.workers = workers or os.cpu_count() or 1
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                # Spawned, not forked: the crawl's pipeline threads are already running
+                self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                     mp_context=multiprocessing.get_context('spawn'))
+            return self._executor
+
+    def _discard_executor(self, executor):
+        """Drop a pool broken by a dead worker (e.g. killed out of memory); the next build starts a new one."""
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False)
+
+    def parse_members(self, zip_ref, framework_regex):
+        """
+        [(member name, {framework: test results})] for the .txt members of an open ZipFile.
+        Raises LogParsingError if a member could not be scanned.
+        """
+        members = [file_info for file_info in zip_ref.infolist() if file_info.filename.endswith('.txt')]
+        executor = self._get_executor() if self.mode == 'process' else None
+        scans = []  # (member name, future or results)
+        paths = []
+        try:
+            for file_info in members:
+                if executor is None and file_info.file_size <= log_spool_settings['max_memory']:
+                    # Uncompressed size: a small archive may still hold members far over the ceiling
+                    scans.append((file_info.filename, scan_log_buffer(zip_ref.read(file_info), framework_regex)))
+                    continue
+                with zip_ref.open(file_info) as log_file, \
+                        tempfile.NamedTemporaryFile(suffix='.txt', delete=False) as member_file:
+                    paths.append(member_file.name)
+                    shutil.copyfileobj(log_file, member_file)
+                if executor is None:
+                    scans.append((file_info.filename, scan_log_file(member_file.name, framework_regex)))
+                else:
+                    try:
+                        future = executor.submit(scan_log_file, member_file.name, framework_regex)
+                    except BrokenProcessPool:
+                        self._discard_executor(executor)
+                        raise LogParsingError(f"Log parsing pool broken before {file_info.filename}")
+                    scans.append((file_info.filename, future))
+            if executor is None:
+                return scans
+
+            results = []
+            failed = []
+            for filename, future in scans:
+                try:
+                    results.append((filename, future.result()))
+                except Exception as e:
+                    logging.error(f"Log parsing worker failed on {filename}: {e}")
+                    failed.append(filename)
+                    if isinstance(e, BrokenProcessPool):
+                        self._discard_executor(executor)
+            if failed:
+                raise LogParsingError(f"{len(failed)} log member(s) could not be parsed: {', '.join(failed)}")
+            return results
+        finally:
+            for path in paths:
+                os.remove(path)
+
+    def close(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
+
+
+_parsing_settings = {'mode': 'inline', 'workers': None}
+_parsing_executor = None
+_parsing_lock = threading.Lock()
+
+
+def configure_log_parsing(mode='inline', workers=None):
+    """Choose inline or process pool log parsing and its size (before the first log is parsed)."""
+    _parsing_settings.update(mode=mode, workers=workers)
+
+
+def get_log_parsing_executor():
+    """Return the process-wide LogParsingExecutor."""
+    global _parsing_executor
+    with _parsing_lock:
+        if _parsing_executor is None:
+            _parsing_executor = LogParsingExecutor(**_parsing_settings)
+        return _parsing_executor
@@ -1,79 +1,256 @@
+import ast
 import csv
 import logging
+import math
 
 
 import csv
 import pandas as pd
 import os
 import logging
+import shutil
+import threading
 
-def save_builds_to_file(builds_info, output_csv):
-    """Save only new builds information to a CSV file without duplicates."""
-    if not builds_info:
-        return  # Skip if no new builds
-
-    fieldnames = [
-        'repo', 'id_build', 'branch', 'commit_sha', 'languages', 'status', 'conclusion', 'created_at',
-        'updated_at', 'build_duration', 'total_builds', 'gh_files_added', 'gh_files_deleted', 'gh_files_modified',
-        'tests_ran', 'gh_lines_added', 'gh_lines_deleted', 'file_types', 'gh_tests_added',
-        'gh_tests_deleted', 'gh_test_churn', 'gh_src_churn', 'gh_pull_req_number', 'gh_is_pr', 'gh_sloc',
-        'gh_description_complexity', 'gh_src_files', 'gh_doc_files', 'gh_other_files', 'git_num_committers',
-        'gh_job_id', 'total_jobs', 'gh_first_commit_created_at', 'gh_team_size_last_3_month',
-        'gh_commits_on_files_touched', 'gh_num_pr_comments', 'git_merged_with', 'gh_test_lines_per_kloc',
-        'build_language', 'dependencies_count', 'workflow_size', 'test_framework', 'tests_passed', 
-        'tests_failed', 'tests_skipped', 'tests_total', 'workflow_name', 'fetch_duration' 
-    ]
-
-    # **Load existing IDs from CSV to prevent duplicates**
-    existing_build_ids = set()
-    if os.path.exists(output_csv):
+FIELDNAMES = [
+    'repo', 'id_build', 'branch', 'commit_sha', 'languages', 'status', 'conclusion', 'created_at',
+    'updated_at', 'build_duration', 'total_builds', 'gh_files_added', 'gh_files_deleted', 'gh_files_modified',
+    'tests_ran', 'gh_lines_added', 'gh_lines_deleted', 'file_types', 'gh_tests_added',
+    'gh_tests_deleted', 'gh_test_churn', 'gh_src_churn', 'gh_pull_req_number', 'gh_is_pr', 'gh_sloc',
+    'gh_description_complexity', 'gh_src_files', 'gh_doc_files', 'gh_other_files', 'git_num_committers',
+    'gh_job_id', 'total_jobs', 'gh_first_commit_created_at', 'gh_team_size_last_3_month',
+    'gh_commits_on_files_touched', 'gh_num_pr_comments', 'git_merged_with', 'gh_test_lines_per_kloc',
+    'build_language', 'dependencies_count', 'workflow_size', 'test_framework', 'tests_passed',
+    'tests_failed', 'tests_skipped', 'tests_total', 'workflow_name', 'fetch_duration', 'tests_per_framework'
+]
+
+# Column types of the typed output backends (Parquet, SQLite); the rest are strings
+INT_COLUMNS = {
+    'id_build', 'total_builds', 'gh_files_added', 'gh_files_deleted', 'gh_files_modified', 'gh_lines_added',
+    'gh_lines_deleted', 'gh_tests_added', 'gh_tests_deleted', 'gh_test_churn', 'gh_src_churn', 'gh_pull_req_number',
+    'gh_sloc', 'gh_description_complexity', 'gh_src_files', 'gh_doc_files', 'gh_other_files', 'git_num_committers',
+    'total_jobs', 'gh_team_size_last_3_month', 'gh_commits_on_files_touched', 'gh_num_pr_comments',
+    'dependencies_count', 'workflow_size', 'tests_passed', 'tests_failed', 'tests_skipped', 'tests_total',
+}
+FLOAT_COLUMNS = {'build_duration', 'gh_test_lines_per_kloc', 'fetch_duration'}
+BOOL_COLUMNS = {'tests_ran', 'gh_is_pr'}
+STRING_LIST_COLUMNS = {'file_types', 'test_framework'}
+INT_LIST_COLUMNS = {'gh_job_id'}
+
+
+def _is_missing(value):
+    return value is None or value == '' or (isinstance(value, float) and math.isnan(value))
+
+
+def coerce_value(name, value):
+    """Convert a build_info value (or its CSV string form) to the column's Python type."""
+    if _is_missing(value):
+        return None
+    if name in INT_COLUMNS:
+        return int(float(value))
+    if name in FLOAT_COLUMNS:
+        return float(value)
+    if name in BOOL_COLUMNS:
+        return value if isinstance(value, bool) else str(value) == 'True'
+    if name in STRING_LIST_COLUMNS or name in INT_LIST_COLUMNS:
+        if isinstance(value, str):
+            value = ast.literal_eval(value) if value.startswith('[') else [part.strip() for part in value.split(',')]
+        cast = int if name in INT_LIST_COLUMNS else str
+        return [cast(item) for item in value]
+    return str(value)
+
+
+class BuildIdIndex:
+    """
+    Append-only index of the (repo, id_build) pairs stored in an output CSV, kept in a
+    sidecar file `<output_csv>.ids` with one `repo,id_build` line per build.
+    It is loaded once per process and appended together with the CSV, so checking and
+    recording a build costs O(1) whatever the size of the output.
+    """
+
+    def __init__(self, output_csv):
+        self.output_csv = output_csv
+        self.path = f"{output_csv}.ids"
+        self.ids = set()
+        self.ids_by_repo = {}
+        self._lock = threading.Lock()
+
+        if os.path.exists(self.path):
+            self._load()
+        elif os.path.isfile(output_csv) and os.path.getsize(output_csv) > 0:
+            self._rebuild()
+
+    def _remember(self, repo, build_id):
+        self.ids.add(build_id)
+        self.ids_by_repo.setdefault(repo, set()).add(build_id)
+
+    def _load(self):
+        with open(self.path, 'r', encoding='utf-8') as file:
+            for line in file:
+                repo, _, build_id = line.rstrip('\n').rpartition(',')
+                if repo and build_id:  # A line cut short by a concurrent append is skipped
+                    self._remember(repo, build_id)
+
+    def _rebuild(self):
+        """One-time migration: index an output CSV written before the index existed."""
         try:
-            existing_df = pd.read_csv(output_csv, usecols=['id_build'])
-            existing_build_ids = set(existing_df['id_build'].astype(str))
+            df = pd.read_csv(self.output_csv, usecols=['repo', 'id_build'], dtype=str)
         except Exception as e:
-            logging.error(f"Error reading existing build IDs from {output_csv}: {e}")
+            logging.error(f"Error reading existing build IDs from {self.output_csv}: {e}")
+            return
+        pairs = [(repo, build_id) for repo, build_id in zip(df['repo'], df['id_build'])]
+        for repo, build_id in pairs:
+            self._remember(repo, build_id)
+        with open(self.path, 'w', encoding='utf-8') as file:
+            file.writelines(f"{repo},{build_id}\n" for repo, build_id in pairs)
+        logging.info(f"Indexed {len(pairs)} existing build(s) of {self.output_csv}")
+
+    def __contains__(self, build_id):
+        return str(build_id) in self.ids
+
+    def ids_for_repo(self, repo):
+        with self._lock:
+            return set(self.ids_by_repo.get(repo, ()))
+
+    def add(self, builds):
+        """Record builds that were just appended to the CSV."""
+        with self._lock:
+            with open(self.path, 'a', encoding='utf-8') as file:
+                for build in builds:
+                    build_id = str(build['id_build'])
+                    self._remember(build['repo'], build_id)
+                    file.write(f"{build['repo']},{build_id}\n")
+
+    def reset(self):
+        """Forget every build (the CSV was recreated)."""
+        with self._lock:
+            self.ids.clear()
+            self.ids_by_repo.clear()
+            if os.path.exists(self.path):
+                os.remove(self.path)
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_build_id_index(output_csv):
+    """Return the process-wide BuildIdIndex of an output CSV."""
+    key = os.path.abspath(output_csv)
+    with _indexes_lock:
+        if key not in _indexes:
+            _indexes[key] = BuildIdIndex(output_csv)
+        return _indexes[key]
 
-    # **Filter out duplicate entries before writing**
-    new_builds = [build for build in builds_info if str(build['id_build']) not in existing_build_ids]
+
+def save_builds_to_file(builds_info, output_csv):
+    """Save only new builds information to a CSV file without duplicates; returns the number of rows written."""
+    if not builds_info:
+        return 0  # Skip if no new builds
+
+    # **Check the build ID index to prevent duplicates**
+    index = get_build_id_index(output_csv)
+    new_builds = []
+    batch_ids = set()
+    for build in builds_info:
+        build_id = str(build['id_build'])
+        if build_id not in index and build_id not in batch_ids:
+            batch_ids.add(build_id)
+            new_builds.append(build)
 
     if new_builds:
         with open(output_csv, mode='a', newline='', encoding='utf-8') as file:
-            writer = csv.DictWriter(file, fieldnames=fieldnames)
+            writer = csv.DictWriter(file, fieldnames=FIELDNAMES)
             if os.stat(output_csv).st_size == 0:
                 writer.writeheader()  # Write header if file is empty
             writer.writerows(new_builds)
+        index.add(new_builds)
         logging.info(f"✅ {len(new_builds)} new build(s) added to {output_csv}.")
     else:
         logging.info(f"⚠️ No new builds to add, skipping file write.")
+    return len(new_builds)
 
 
 
 import os
 
+def upgrade_header(output_csv):
+    """
+    Rewrite the header of a CSV written before columns were appended to FIELDNAMES; its
+    rows keep their fields and read back with the new columns empty.
+    """
+    tmp_path = f"{output_csv}.tmp"
+    with open(output_csv, mode='r', newline='', encoding='utf-8') as source, \
+            open(tmp_path, mode='w', newline='', encoding='utf-8') as target:
+        source.readline()
+        csv.writer(target).writerow(FIELDNAMES)
+        shutil.copyfileobj(source, target)
+    os.replace(tmp_path, output_csv)
+    logging.info(f"Upgraded the header of {output_csv} to the current columns")
+
+
 def save_head(output_csv):
     """Save builds information to a CSV file, avoiding duplicate headers."""
-    fieldnames = [
-        'repo', 'id_build', 'branch', 'commit_sha', 'languages', 'status', 'conclusion', 'created_at',
-        'updated_at', 'build_duration', 'total_builds', 'gh_files_added', 'gh_files_deleted', 'gh_files_modified',
-        'tests_ran', 'gh_lines_added', 'gh_lines_deleted', 'file_types', 'gh_tests_added',
-        'gh_tests_deleted', 'gh_test_churn', 'gh_src_churn', 'gh_pull_req_number', 'gh_is_pr', 'gh_sloc',
-        'gh_description_complexity', 'gh_src_files', 'gh_doc_files', 'gh_other_files', 'git_num_committers',
-        'gh_job_id', 'total_jobs', 'gh_first_commit_created_at', 'gh_team_size_last_3_month',
-        'gh_commits_on_files_touched', 'gh_num_pr_comments', 'git_merged_with', 'gh_test_lines_per_kloc',
-        'build_language', 'dependencies_count', 'workflow_size', 'test_framework', 'tests_passed', 'tests_failed',
-        'tests_skipped', 'tests_total', 'workflow_name','fetch_duration'  # New field for fetch duration
-    ]
-
     # Check if the file exists and already contains data
     if os.path.exists(output_csv) and os.path.getsize(output_csv) > 0:
         with open(output_csv, mode='r', encoding='utf-8') as file:
             first_line = file.readline()
-            if first_line.strip() == ','.join(fieldnames):
-                logging.info(f"Header already exists in {output_csv}. Skipping header write.")
-                return  # Header already exists, skip writing it
+        header = first_line.strip().split(',')
+        if header == FIELDNAMES:
+            logging.info(f"Header already exists in {output_csv}. Skipping header write.")
+            return  # Header already exists, skip writing it
+        if header == FIELDNAMES[:len(header)]:
+            upgrade_header(output_csv)  # Older output: keep its builds
+            return
 
     # Write the header if the file is empty or does not exist
     with open(output_csv, mode='w', newline='', encoding='utf-8') as file:
-        writer = csv.DictWriter(file, fieldnames=fieldnames)
+        writer = csv.DictWriter(file, fieldnames=FIELDNAMES)
         writer.writeheader()
+    get_build_id_index(output_csv).reset()
     logging.info(f"CSV header with fetch duration saved to {output_csv}")
+
+
+class CsvBuildWriter:
+    """Output backend appending builds to a CSV file (the default)."""
+
+    def __init__(self, output_csv):
+        self.output_csv = output_csv
+
+    def existing_ids(self, repo):
+        return get_build_id_index(self.output_csv).ids_for_repo(repo)
+
+    def write(self, builds, on_written=None):
+        save_builds_to_file(builds, self.output_csv)
+        if on_written is not None:
+            on_written()
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+OUTPUT_FORMATS = ('csv', 'parquet', 'sqlite')
+
+
+def open_build_writer(output_format, output_path):
+    """Return the output backend of a format: an object with existing_ids/write/flush/close."""
+    if output_format == 'parquet':
+        from parquet_writer import ParquetBuildWriter  # pyarrow is only needed for this format
+        return ParquetBuildWriter(output_path)
+    if output_format == 'sqlite':
+        from sqlite_writer import SqliteBuildWriter
+        return SqliteBuildWriter(output_path)
+    return CsvBuildWriter(output_path)
+
+
+def merge_output_shard(shard_csv, output_csv):
+    """Append the builds of a worker's output shard to the main CSV, skipping duplicates; returns the number appended."""
+    if not os.path.exists(shard_csv) or os.path.getsize(shard_csv) == 0:
+        return 0
+
+    with open(shard_csv, mode='r', newline='', encoding='utf-8') as file:
+        shard_builds = list(csv.DictReader(file))
+
+    return save_builds_to_file(shard_builds, output_csv)
@@ -0,0 +1,162 @@
+import logging
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+
+def estimate_size(value):
+    """Approximate memory footprint of a value in bytes, containers included."""
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(estimate_size(key) + estimate_size(item) for key, item in value.items())
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        size += sum(estimate_size(item) for item in value)
+    return size
+
+
+class NamespaceView:
+    """One namespace of a MetricsCache, with the get/put interface of a plain cache."""
+
+    def __init__(self, cache, namespace, ttl=None):
+        self.cache = cache
+        self.namespace = namespace
+        self.ttl = ttl
+
+    def get(self, key, default=None):
+        return self.cache.get(self.namespace, key, default)
+
+    def put(self, key, value):
+        self.cache.put(self.namespace, key, value, ttl=self.ttl)
+
+    def delete(self, key):
+        self.cache.delete(self.namespace, key)
+
+
+class MetricsCache:
+    """
+    In-memory LRU cache bounded by the estimated size of its entries rather than their
+    number, shared by the commit, pull request and file content lookups of a process.
+    Keys live in namespaces (e.g. "commit/<owner>/<repo>"), each indexing its own keys so
+    listing or dropping a namespace never scans the others. Entries may expire after a TTL.
+    Hits, misses, evictions and expirations are counted per namespace.
+    """
+
+    def __init__(self, max_bytes=512 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries = OrderedDict()  # (namespace, key) -> (value, size, expires_at), least recent first
+        self._namespaces = {}  # namespace -> {key: None}, keys in insertion order
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def _count(self, namespace, event):
+        stats = self._stats.setdefault(namespace, {'hits': 0, 'misses': 0, 'evictions': 0, 'expirations': 0})
+        stats[event] += 1
+
+    def _remove(self, entry_key):
+        _, size, _ = self._entries.pop(entry_key)
+        self.size -= size
+        namespace, key = entry_key
+        keys = self._namespaces[namespace]
+        del keys[key]
+        if not keys:
+            del self._namespaces[namespace]
+
+    def _lookup(self, namespace, key):
+        """The live entry of a key, or None; expired entries are dropped. Caller holds the lock."""
+        entry = self._entries.get((namespace, key))
+        if entry is None:
+            return None
+        expires_at = entry[2]
+        if expires_at is not None and expires_at <= time.time():
+            self._remove((namespace, key))
+            self._count(namespace, 'expirations')
+            return None
+        return entry
+
+    def get(self, namespace, key, default=None):
+        with self._lock:
+            entry = self._lookup(namespace, key)
+            if entry is None:
+                self._count(namespace, 'misses')
+                return default
+            self._entries.move_to_end((namespace, key))
+            self._count(namespace, 'hits')
+            return entry[0]
+
+    def put(self, namespace, key, value, ttl=None):
+        size = estimate_size(value)
+        if size > self.max_bytes:
+            return  # Would evict everything else
+        expires_at = time.time() + ttl if ttl is not None else None
+        with self._lock:
+            if (namespace, key) in self._entries:
+                self._remove((namespace, key))
+            while self._entries and self.size + size > self.max_bytes:
+                least_recent = next(iter(self._entries))
+                self._remove(least_recent)
+                self._count(least_recent[0], 'evictions')
+            self._entries[(namespace, key)] = (value, size, expires_at)
+            self._namespaces.setdefault(namespace, {})[key] = None
+            self.size += size
+
+    def delete(self, namespace, key):
+        with self._lock:
+            if (namespace, key) in self._entries:
+                self._remove((namespace, key))
+
+    def items(self, namespace):
+        """Live (key, value) pairs of a namespace, without touching the other namespaces."""
+        with self._lock:
+            items = []
+            for key in list(self._namespaces.get(namespace, ())):
+                entry = self._lookup(namespace, key)
+                if entry is not None:
+                    items.append((key, entry[0]))
+            return items
+
+    def clear_namespace(self, namespace):
+        with self._lock:
+            for key in list(self._namespaces.get(namespace, ())):
+                self._remove((namespace, key))
+
+    def namespace(self, namespace, ttl=None):
+        return NamespaceView(self, namespace, ttl)
+
+    def stats(self):
+        """Counters per namespace group (the part of the namespace before the first '/')."""
+        with self._lock:
+            grouped = {}
+            for namespace, stats in self._stats.items():
+                group = grouped.setdefault(namespace.split('/', 1)[0], dict.fromkeys(stats, 0))
+                for event, count in stats.items():
+                    group[event] += count
+            return grouped
+
+    def log_stats(self):
+        for group, stats in sorted(self.stats().items()):
+            lookups = stats['hits'] + stats['misses']
+            hit_rate = stats['hits'] / lookups if lookups else 0.0
+            logging.info(f"Cache {group}: {stats['hits']} hits, {stats['misses']} misses ({hit_rate:.0%} hit rate), "
+                         f"{stats['evictions']} evictions, {stats['expirations']} expirations")
+        logging.info(f"Cache size: {self.size / 1024 / 1024:.1f} MB of {self.max_bytes / 1024 / 1024:.0f} MB")
+
+
+_cache_settings = {'max_bytes': 512 * 1024 * 1024}
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def configure_metrics_cache(max_bytes):
+    """Set the memory budget of the process-wide cache (before its first use)."""
+    _cache_settings['max_bytes'] = max_bytes
+
+
+def get_metrics_cache():
+    """Return the process-wide MetricsCache."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = MetricsCache(**_cache_settings)
+        return _cache
@@ -0,0 +1,122 @@
+import logging
+import os
+import threading
+import time
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Optional dependency, only needed for --output-format parquet
+    pa = None
+    pq = None
+
+from metrics_aggregator import (FIELDNAMES, BuildIdIndex, INT_COLUMNS, FLOAT_COLUMNS, BOOL_COLUMNS, STRING_LIST_COLUMNS,
+                                INT_LIST_COLUMNS, coerce_value)
+
+
+def build_schema():
+    """Arrow schema of a build row; list-valued metrics are real list columns."""
+    fields = []
+    for name in FIELDNAMES:
+        if name in INT_COLUMNS:
+            field_type = pa.int64()
+        elif name in FLOAT_COLUMNS:
+            field_type = pa.float64()
+        elif name in BOOL_COLUMNS:
+            field_type = pa.bool_()
+        elif name in STRING_LIST_COLUMNS:
+            field_type = pa.list_(pa.string())
+        elif name in INT_LIST_COLUMNS:
+            field_type = pa.list_(pa.int64())
+        else:
+            field_type = pa.string()
+        fields.append(pa.field(name, field_type))
+    return pa.schema(fields)
+
+
+class ParquetBuildWriter:
+    """
+    Output backend writing typed Parquet files partitioned by repository
+    (`<output_dir>/repo=<owner>__<name>/part-*.parquet`). Rows are buffered and written
+    in batches; each partition keeps its own build ID index, so worker processes crawling
+    different repositories never touch the same files.
+    """
+
+    def __init__(self, output_dir, batch_size=1000):
+        if pa is None:
+            raise ImportError("Parquet output requires pyarrow: pip install pyarrow")
+        self.output_dir = output_dir
+        self.batch_size = batch_size
+        self.schema = build_schema()
+        self._buffers = {}  # repo -> list of (row, on_written callback)
+        self._indexes = {}
+        self._buffered_ids = set()
+        self._lock = threading.Lock()
+        self._part = 0
+        os.makedirs(output_dir, exist_ok=True)
+
+    def _partition_dir(self, repo):
+        return os.path.join(self.output_dir, f"repo={repo.replace('/', '__')}")
+
+    def _index(self, repo):
+        if repo not in self._indexes:
+            partition_dir = self._partition_dir(repo)
+            os.makedirs(partition_dir, exist_ok=True)
+            # Dataset readers skip files starting with '_' or '.', the index must not look like a part
+            index_base = os.path.join(partition_dir, '_builds')
+            legacy_path = os.path.join(partition_dir, 'builds.ids')
+            if os.path.exists(legacy_path) and not os.path.exists(f"{index_base}.ids"):
+                os.replace(legacy_path, f"{index_base}.ids")
+            self._indexes[repo] = BuildIdIndex(index_base)
+        return self._indexes[repo]
+
+    def existing_ids(self, repo):
+        with self._lock:
+            return self._index(repo).ids_for_repo(repo)
+
+    def write(self, builds, on_written=None):
+        """Buffer builds; on_written is called once they are actually on disk."""
+        with self._lock:
+            new_rows = []
+            for build in builds:
+                build_id = str(build['id_build'])
+                if build_id in self._index(build['repo']) or build_id in self._buffered_ids:
+                    continue  # Already written or waiting in a buffer
+                self._buffered_ids.add(build_id)
+                new_rows.append((build['repo'], {name: coerce_value(name, build.get(name)) for name in FIELDNAMES}))
+
+            for position, (repo, row) in enumerate(new_rows):
+                callback = on_written if position == len(new_rows) - 1 else None
+                self._buffers.setdefault(repo, []).append((row, callback))
+                if len(self._buffers[repo]) >= self.batch_size:
+                    self._flush_repo(repo)
+
+        if on_written is not None and not new_rows:
+            on_written()  # Nothing new to wait for
+
+    def _flush_repo(self, repo):
+        entries = self._buffers.pop(repo, [])
+        if not entries:
+            return
+        rows = [row for row, _ in entries]
+        self._part += 1
+        filename = f"part-{int(time.time())}-{os.getpid()}-{self._part}.parquet"
+        path = os.path.join(self._partition_dir(repo), filename)
+        table = pa.Table.from_pylist(rows, schema=self.schema)
+        tmp_path = os.path.join(self._partition_dir(repo), f".{filename}.tmp")  # Hidden from dataset readers
+        pq.write_table(table, tmp_path, compression='zstd')
+        os.replace(tmp_path, path)  # Readers never see a half-written part
+        self._index(repo).add(rows)
+        self._buffered_ids.difference_update(str(row['id_build']) for row in rows)
+        logging.info(f"✅ {len(rows)} build(s) of {repo} written to {path}.")
+        for _, callback in entries:
+            if callback is not None:
+                callback()
+
+    def flush(self):
+        with self._lock:
+            for repo in list(self._buffers):
+                self._flush_repo(repo)
+
+    def close(self):
+        self.flush()
@@ -1,3 +1,4 @@
+import functools
 import re
 
 framework_regex = {
@@ -14,4 +15,12 @@ framework_regex = {
     "Cucumber-Java": re.compile(r"Tests run: (\d+), Failures: (\d+), Errors: (\d+), Skipped: (\d+)"),
     "testunit": re.compile(
         r"(\d+) tests, (\d+) assertions, (\d+) failures, (\d+) errors, (\d+) pendings, (\d+) omissions, (\d+) notifications")
-}
\ No newline at end of file
+}
+
+
+@functools.lru_cache(maxsize=None)
+def bytes_regex(regex):
+    """Bytes version of a compiled str pattern, to match log data without decoding it."""
+    if isinstance(regex.pattern, bytes):
+        return regex
+    return re.compile(regex.pattern.encode('utf-8'), regex.flags & ~re.UNICODE)
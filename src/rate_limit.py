@@ -0,0 +1,187 @@
+import logging
+import os
+import threading
+import time
+
+
+def load_tokens(value):
+    """
+    Parse the -t/--token argument: a single token, a comma-separated list of tokens,
+    or the path of a file holding one token per line (blank lines and # comments ignored).
+    """
+    if value is None:
+        return []
+    if os.path.isfile(value):
+        with open(value, 'r', encoding='utf-8') as file:
+            lines = [line.strip() for line in file]
+        return [line for line in lines if line and not line.startswith('#')]
+    return [token.strip() for token in value.split(',') if token.strip()]
+
+
+def rate_limit_resource(url):
+    """Guess the rate limit bucket a request is charged to before GitHub tells us."""
+    if '/graphql' in url:
+        return 'graphql'
+    if '/search/' in url:
+        return 'search'
+    return 'core'
+
+
+class TokenPool:
+    """
+    Set of GitHub tokens used in rotation. The client asks the RateLimitGovernor for the
+    token whose budget allows the earliest request, so the crawl only waits once every
+    token is exhausted.
+    """
+
+    def __init__(self, tokens):
+        self.tokens = list(dict.fromkeys(tokens))  # Drop duplicates, keep order
+        if not self.tokens:
+            raise ValueError("TokenPool needs at least one token")
+
+    def __len__(self):
+        return len(self.tokens)
+
+    def __repr__(self):
+        return f"TokenPool({len(self.tokens)} tokens)"  # Never print the tokens themselves
+
+
+class RateLimitGovernor:
+    """
+    Tracks the quota left and the reset time of every (token, bucket) pair, for the core,
+    search and GraphQL buckets, from the X-RateLimit-* response headers. Requests are
+    spaced so that a bucket's remaining budget is spread evenly until its reset: no idle
+    time while quota is left, and no hard stall when it runs out.
+    """
+
+    def __init__(self):
+        self._budgets = {}
+        self._lock = threading.Lock()
+
+    def _budget(self, token, resource):
+        budget = self._budgets.setdefault((token, resource), {'remaining': None, 'reset': 0.0, 'next_slot': 0.0})
+        if budget['remaining'] is not None and budget['reset'] <= time.time():
+            # The window has reset: the budget is unknown again until the next response
+            budget.update(remaining=None, reset=0.0, next_slot=0.0)
+        return budget
+
+    @staticmethod
+    def _earliest_start(budget, now):
+        if budget['remaining'] is None:
+            return now  # Nothing observed yet, do not pace
+        if budget['remaining'] <= 0:
+            return max(now, budget['reset'] + 1)
+        return max(now, budget['next_slot'])
+
+    def reserve(self, tokens, resource='core'):
+        """
+        Book the next request slot among `tokens` for a bucket.
+        Returns (token, seconds to wait before sending the request).
+        """
+        with self._lock:
+            now = time.time()
+            token = min(tokens, key=lambda t: (self._earliest_start(self._budget(t, resource), now),
+                                               -(self._budget(t, resource)['remaining'] or 0)))
+            budget = self._budget(token, resource)
+            start = self._earliest_start(budget, now)
+            if budget['remaining'] is not None and budget['remaining'] > 0:
+                budget['next_slot'] = start + max(0.0, budget['reset'] - start) / budget['remaining']
+                budget['remaining'] -= 1  # Booked until the response reports the real figure
+            return token, start - now
+
+    def update(self, token, headers):
+        """Record the quota reported by a response sent with `token`."""
+        remaining = headers.get('X-RateLimit-Remaining')
+        reset = headers.get('X-RateLimit-Reset')
+        if remaining is None or reset is None:
+            return
+        resource = headers.get('X-RateLimit-Resource', 'core')
+        with self._lock:
+            budget = self._budget(token, resource)
+            budget['remaining'] = int(remaining)
+            budget['reset'] = float(reset)
+
+    def block(self, token, headers, min_wait=10):
+        """
+        A response sent with `token` hit the primary rate limit: hold its bucket until the
+        reset plus min_wait seconds, counted from now if the local clock is ahead of GitHub's,
+        so a retry never goes out before the window has actually rolled over.
+        """
+        resource = headers.get('X-RateLimit-Resource', 'core')
+        with self._lock:
+            budget = self._budget(token, resource)
+            budget['remaining'] = 0
+            budget['reset'] = max(float(headers['X-RateLimit-Reset']), time.time()) + min_wait
+
+    def wait(self, tokens, resource='core'):
+        """Reserve a slot, sleep until it comes up and return the token to use."""
+        token, delay = self.reserve(tokens, resource)
+        if delay > 30:
+            logging.warning(f"Rate limit budget of the {resource} bucket exhausted, waiting {delay:.0f} seconds.")
+        if delay > 0:
+            time.sleep(delay)
+        return token
+
+
+def is_secondary_rate_limit(response):
+    """
+    True for GitHub's secondary (abuse) rate limit answers: a 403/429 carrying Retry-After
+    or an abuse/secondary rate limit message while the primary quota is not exhausted.
+    """
+    if response.status_code not in (403, 429):
+        return False
+    if response.headers.get('Retry-After'):
+        return True
+    if response.headers.get('X-RateLimit-Remaining') == '0':
+        return False  # Primary rate limit, handled by the governor
+    try:
+        message = response.text.lower()
+    except Exception:
+        return False
+    return 'secondary rate limit' in message or 'abuse' in message
+
+
+class AdaptiveConcurrency:
+    """
+    AIMD limit on the number of requests in flight. Every successful response raises the
+    limit additively (about +1 per limit's worth of successes); a secondary rate limit
+    halves it and holds every new request until GitHub's Retry-After has passed.
+    """
+
+    def __init__(self, maximum=8, minimum=1):
+        self.maximum = max(1, maximum)
+        self.minimum = max(1, min(minimum, self.maximum))
+        self.limit = float(self.maximum)
+        self.in_flight = 0
+        self._paused_until = 0.0
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        with self._condition:
+            while True:
+                pause = self._paused_until - time.time()
+                if pause > 0:
+                    self._condition.wait(pause)
+                elif self.in_flight >= int(self.limit):
+                    self._condition.wait()
+                else:
+                    self.in_flight += 1
+                    return
+
+    def release(self):
+        with self._condition:
+            self.in_flight -= 1
+            self._condition.notify_all()
+
+    def on_success(self):
+        with self._condition:
+            if self.limit < self.maximum:
+                self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+                self._condition.notify_all()
+
+    def on_throttle(self, retry_after):
+        """Multiplicative decrease, and pause new requests for `retry_after` seconds."""
+        with self._condition:
+            self.limit = max(self.minimum, self.limit / 2)
+            self._paused_until = max(self._paused_until, time.time() + retry_after)
+            logging.warning(f"Secondary rate limit: concurrency cut to {int(self.limit)}, pausing {retry_after:.0f} seconds.")
@@ -5,6 +5,7 @@ import time
 import math
 import base64
 from request_github import get_request
+from metrics_cache import get_metrics_cache
 
 import base64
 import logging
@@ -20,6 +21,10 @@ def count_lines_in_workflow_yml(repo_full_name, workflow_path, commit_sha, token
         return None  # Return NaN if path is empty
 
     url = f"https://api.github.com/repos/{repo_full_name}/contents/{workflow_path}?ref={commit_sha}"
+    cache_key = (repo_full_name, workflow_path, commit_sha)
+    line_count = get_metrics_cache().get('workflow_size', cache_key)
+    if line_count is not None:
+        return line_count  # Runs of one workflow at the same commit share their file
 
     try:
         response = get_request(url, token)
@@ -27,7 +32,9 @@ def count_lines_in_workflow_yml(repo_full_name, workflow_path, commit_sha, token
         if response and 'content' in response:
             try:
                 content = base64.b64decode(response['content']).decode('utf-8')
-                return len(content.splitlines())  # Return line count
+                line_count = len(content.splitlines())
+                get_metrics_cache().put('workflow_size', cache_key, line_count)
+                return line_count  # Return line count
             except (base64.binascii.Error, UnicodeDecodeError):
                 return np.nan  # Return NaN if file is binary or unreadable
         elif response and response.get('message') == 'Not Found':
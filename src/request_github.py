@@ -1,66 +1,189 @@
 import requests
+from requests.adapters import HTTPAdapter
 from datetime import datetime, timezone, timedelta
+from collections import defaultdict
 import csv
 import os
+import re
 import time
 import math
 import logging
 import base64
-import re
+import threading
 import numpy as np
 
-def get_request(url, token):
-    headers = {'Authorization': f'token {token}'}
-    attempt = 0
-    max_attempts = 5  # Number of attempts before applying infinite retry on connection errors
-
-    while True:
-        try:
-            response = requests.get(url, headers=headers, timeout=10)  # Set a timeout to avoid hanging requests
-            
-            # Check rate limit headers proactively
-            remaining_requests = int(response.headers.get('X-RateLimit-Remaining', 1))  # Default to 1 if missing
-            reset_time = response.headers.get('X-RateLimit-Reset')
-
-            if remaining_requests == 0 and reset_time:
-                sleep_time = max(0, (datetime.fromtimestamp(int(reset_time), timezone.utc) - datetime.now(timezone.utc)).total_seconds() + 10)
-                logging.warning(f"Rate limit hit! Sleeping for {sleep_time} seconds.")
-                time.sleep(sleep_time)
-                continue  # Retry after sleeping
-
-            if response.status_code == 200:
-                return response.json()
-            elif response.status_code == 403 and reset_time:
-                sleep_time = max(0, (datetime.fromtimestamp(int(reset_time), timezone.utc) - datetime.now(timezone.utc)).total_seconds() + 10)
-                logging.error(f"Rate limit exceeded, sleeping for {sleep_time} seconds. URL: {url}")
-                time.sleep(sleep_time)
-                continue  # Retry after sleeping
-            elif response.status_code in [500, 502, 503, 504]:
-                # Retry on server errors
+from response_cache import ResponseCache
+from rate_limit import TokenPool, RateLimitGovernor, AdaptiveConcurrency, rate_limit_resource, is_secondary_rate_limit
+
+API_ROOT = "https://api.github.com"
+
+
+def endpoint_key(url):
+    """
+    Collapse a GitHub URL into an endpoint template so that counters are grouped
+    per endpoint rather than per repository, run or commit.
+    """
+    path = url.split('?', 1)[0]
+    if path.startswith(API_ROOT):
+        path = path[len(API_ROOT):]
+    path = re.sub(r'^/repos/[^/]+/[^/]+', '/repos/{repo}', path)
+    path = re.sub(r'/contents/.*$', '/contents/{path}', path)
+    path = re.sub(r'/[0-9a-f]{40}(?=/|$)', '/{sha}', path)
+    path = re.sub(r'/\d+(?=/|$)', '/{id}', path)
+    return path or '/'
+
+
+class GitHubClient:
+    """
+    Single HTTP client shared by every module that talks to GitHub.
+    Keeps a pooled keep-alive session, negotiates gzip, applies one retry policy,
+    paces requests through a RateLimitGovernor, adapts the number of requests in
+    flight to secondary rate limits and keeps per-endpoint counters.
+    When a ResponseCache is given, GETs are sent as conditional requests.
+    """
+
+    def __init__(self, pool_size=20, timeout=10, max_attempts=5, cache=None, max_in_flight=8):
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.headers.update({
+            'Accept': 'application/vnd.github+json',
+            'Accept-Encoding': 'gzip, deflate',
+        })
+        self.timeout = timeout
+        self.max_attempts = max_attempts
+        self.cache = cache
+        self.governor = RateLimitGovernor()
+        self.concurrency = AdaptiveConcurrency(maximum=max_in_flight)
+        self.pid = os.getpid()
+        self.endpoint_stats = defaultdict(lambda: defaultdict(int))
+        self._stats_lock = threading.Lock()
+
+    def _count(self, endpoint, name, amount=1):
+        with self._stats_lock:
+            self.endpoint_stats[endpoint][name] += amount
+
+    def request(self, url, token=None, stream=False):
+        """
+        Send a GET request with the shared retry policy.
+        `token` is a single token or a TokenPool to pick a token from on every attempt.
+        Returns the final response (any status) or None if the network kept failing.
+        """
+        tokens = token.tokens if isinstance(token, TokenPool) else [token]
+        resource = rate_limit_resource(url)
+        endpoint = endpoint_key(url)
+        attempt = 0
+        throttle_attempt = 0
+
+        # Streamed downloads (logs) are redirects to blob storage and are never cached
+        cached_entry = self.cache.get(url) if self.cache and not stream else None
+        base_headers = ResponseCache.validators(cached_entry) if cached_entry else {}
+
+        while True:
+            current_token = self.governor.wait(tokens, resource)
+            headers = dict(base_headers)
+            if current_token:
+                headers['Authorization'] = f'token {current_token}'
+            try:
+                self._count(endpoint, 'requests')
+                self.concurrency.acquire()
+                try:
+                    response = self.session.get(url, headers=headers, timeout=self.timeout, stream=stream)
+                finally:
+                    self.concurrency.release()
+                self._count(endpoint, f'status_{response.status_code}')
+                self.governor.update(current_token, response.headers)
+
+                remaining_requests = int(response.headers.get('X-RateLimit-Remaining', 1))  # Default to 1 if missing
+                reset_time = response.headers.get('X-RateLimit-Reset')
+
+                if response.status_code in [403, 429] and remaining_requests == 0 and reset_time:
+                    logging.warning(f"Rate limit hit for the {resource} bucket. URL: {url}")
+                    self._count(endpoint, 'rate_limited')
+                    response.close()
+                    self.governor.block(current_token, response.headers)
+                    continue  # The governor holds the retry until another token or the reset frees a slot
+
+                if is_secondary_rate_limit(response) and throttle_attempt < self.max_attempts:
+                    # GitHub asks to wait Retry-After, or at least a minute with exponential growth
+                    retry_after = response.headers.get('Retry-After')
+                    wait_time = int(retry_after) if retry_after and retry_after.isdigit() else min(60 * 2 ** throttle_attempt, 900)
+                    self._count(endpoint, 'secondary_rate_limited')
+                    response.close()
+                    self.concurrency.on_throttle(wait_time)
+                    throttle_attempt += 1
+                    continue  # acquire() holds the retry until the pause is over
+
+                if response.status_code in [500, 502, 503, 504] and attempt < self.max_attempts:
+                    wait_time = min(2 ** attempt, 60)  # Exponential backoff up to 60 seconds
+                    logging.warning(f"GitHub server error {response.status_code}. Retrying in {wait_time} seconds.")
+                    self._count(endpoint, 'retries')
+                    response.close()
+                    time.sleep(wait_time)
+                    attempt += 1
+                    continue
+
+                if response.status_code < 400:
+                    self.concurrency.on_success()
+
+                if response.status_code == 304 and cached_entry:
+                    self._count(endpoint, 'cache_hits')
+                    return ResponseCache.to_response(cached_entry, response)
+                if response.status_code == 200 and self.cache and not stream:
+                    self.cache.store(url, response)
+
+                return response
+
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                # Connection problems are retried forever: a long crawl should survive network outages
                 wait_time = min(2 ** attempt, 60)  # Exponential backoff up to 60 seconds
-                logging.warning(f"GitHub server error {response.status_code}. Retrying in {wait_time} seconds.")
+                logging.error(f"Network error fetching {url}: {e}. Retrying in {wait_time} seconds...")
+                self._count(endpoint, 'retries')
                 time.sleep(wait_time)
-                attempt += 1
-            else:
-                return None  # Return None for non-retryable failures
-
-        except requests.exceptions.ConnectionError:
-            wait_time = min(2 ** attempt, 60)  # Exponential backoff up to 60 seconds
-            logging.error(f"Network error: Connection lost. Retrying in {wait_time} seconds...")
-            time.sleep(wait_time)
-            attempt += 1
-
-        except requests.exceptions.Timeout:
-            wait_time = min(2 ** attempt, 60)  # Exponential backoff up to 60 seconds
-            logging.error(f"Request timed out. Retrying in {wait_time} seconds...")
-            time.sleep(wait_time)
-            attempt += 1
-
-        except requests.exceptions.RequestException as e:
-            logging.error(f"Unexpected error fetching {url}: {e}")
-            return None  # Return None on unknown request errors
-
-        # If exceeded max_attempts, switch to infinite retry for connection issues
-        if attempt >= max_attempts:
-            logging.error("Max attempts reached. Entering infinite retry mode for connection errors.")
-            attempt = max_attempts - 1  # Prevent integer overflow
+                attempt = min(attempt + 1, self.max_attempts)
+
+            except requests.exceptions.RequestException as e:
+                logging.error(f"Unexpected error fetching {url}: {e}")
+                self._count(endpoint, 'errors')
+                return None
+
+    def log_stats(self):
+        """Log the per-endpoint request counters."""
+        with self._stats_lock:
+            for endpoint, counters in sorted(self.endpoint_stats.items()):
+                summary = ', '.join(f"{name}={value}" for name, value in sorted(counters.items()))
+                logging.info(f"GitHub endpoint {endpoint}: {summary}")
+
+
+_client = None
+_client_lock = threading.Lock()
+_client_settings = {'cache_dir': None, 'max_in_flight': 8}
+
+
+def configure_client(cache_dir=None, max_in_flight=8):
+    """Set the options used to build the process-wide client (call before the first request)."""
+    global _client
+    with _client_lock:
+        _client_settings['cache_dir'] = cache_dir
+        _client_settings['max_in_flight'] = max_in_flight
+        _client = None
+
+
+def get_client():
+    """Return the process-wide GitHub client, creating it on first use (and after a fork)."""
+    global _client
+    with _client_lock:
+        if _client is None or _client.pid != os.getpid():
+            cache_dir = _client_settings['cache_dir']
+            _client = GitHubClient(cache=ResponseCache(cache_dir) if cache_dir else None,
+                                   max_in_flight=_client_settings['max_in_flight'])
+        return _client
+
+
+def get_request(url, token):
+    response = get_client().request(url, token)
+    if response is None:
+        return None
+    if response.status_code == 200:
+        return response.json()
+    return None  # Return None for non-retryable failures
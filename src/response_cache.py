@@ -0,0 +1,85 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+
+class ResponseCache:
+    """
+    On-disk cache of GitHub API responses keyed by URL.
+    Stores the body together with its ETag / Last-Modified validators so that
+    later crawls can send conditional requests; a 304 answer is served from here
+    and does not count against the rate limit.
+    """
+
+    # Response headers worth keeping with the body (pagination and content type)
+    kept_headers = ('Link', 'Content-Type', 'ETag', 'Last-Modified')
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, url):
+        digest = hashlib.sha1(url.encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, digest[:2], f"{digest}.json")
+
+    def get(self, url):
+        """Return the cached entry for a URL, or None."""
+        path = self._path(url)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'r', encoding='utf-8') as file:
+                entry = json.load(file)
+            return entry if entry.get('url') == url else None
+        except (OSError, ValueError) as e:
+            logging.warning(f"Ignoring unreadable cache entry {path}: {e}")
+            return None
+
+    @staticmethod
+    def validators(entry):
+        """Return the conditional request headers for a cached entry."""
+        headers = {}
+        if entry['headers'].get('ETag'):
+            headers['If-None-Match'] = entry['headers']['ETag']
+        if entry['headers'].get('Last-Modified'):
+            headers['If-Modified-Since'] = entry['headers']['Last-Modified']
+        return headers
+
+    def store(self, url, response):
+        """Cache a successful response if GitHub sent a validator for it."""
+        if not (response.headers.get('ETag') or response.headers.get('Last-Modified')):
+            return
+        entry = {
+            'url': url,
+            'headers': {name: response.headers[name] for name in self.kept_headers if name in response.headers},
+            'body': response.text,
+        }
+        path = self._path(url)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as file:
+                json.dump(entry, file)
+            os.replace(tmp_path, path)  # Atomic, so concurrent crawlers never read half an entry
+        except OSError as e:
+            logging.warning(f"Failed to cache response for {url}: {e}")
+
+    @staticmethod
+    def to_response(entry, not_modified):
+        """Rebuild a 200 response from a cached entry, refreshing it with the 304 headers."""
+        response = requests.Response()
+        response.status_code = 200
+        response.url = entry['url']
+        response.encoding = 'utf-8'
+        response.headers = CaseInsensitiveDict(entry['headers'])
+        # Rate limit headers come from the live 304 answer
+        for name, value in not_modified.headers.items():
+            if name.lower().startswith('x-ratelimit-'):
+                response.headers[name] = value
+        response._content = entry['body'].encode('utf-8')
+        return response
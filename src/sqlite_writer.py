@@ -0,0 +1,101 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+
+from metrics_aggregator import (FIELDNAMES, INT_COLUMNS, FLOAT_COLUMNS, BOOL_COLUMNS, STRING_LIST_COLUMNS,
+                                INT_LIST_COLUMNS, coerce_value)
+
+INDEXED_COLUMNS = ('commit_sha', 'created_at', 'conclusion')
+
+
+def column_type(name):
+    if name in INT_COLUMNS or name in BOOL_COLUMNS:
+        return 'INTEGER'
+    if name in FLOAT_COLUMNS:
+        return 'REAL'
+    return 'TEXT'  # Strings, and list columns stored as JSON arrays
+
+
+def to_sql_value(name, value):
+    value = coerce_value(name, value)
+    if value is not None and (name in STRING_LIST_COLUMNS or name in INT_LIST_COLUMNS):
+        return json.dumps(value)
+    return value
+
+
+class SqliteBuildWriter:
+    """
+    Output backend storing builds in a SQLite table keyed by (repo, id_build), with indexes
+    on commit_sha, created_at and conclusion. Rows are upserted in batches, one transaction
+    per batch. The database runs in WAL mode with a busy timeout, so the worker processes
+    of --workers can all write to the same file.
+    """
+
+    def __init__(self, db_path, batch_size=500, timeout=60):
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self._buffer = []  # (values, on_written callback)
+        self._lock = threading.Lock()
+        directory = os.path.dirname(os.path.abspath(db_path))
+        os.makedirs(directory, exist_ok=True)
+        # Used by the pipeline's output thread and by the thread calling flush()/close()
+        self._connection = sqlite3.connect(db_path, timeout=timeout, check_same_thread=False)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute('PRAGMA synchronous=NORMAL')
+        self._create_schema()
+
+        columns = ', '.join(FIELDNAMES)
+        placeholders = ', '.join('?' for _ in FIELDNAMES)
+        updates = ', '.join(f"{name}=excluded.{name}" for name in FIELDNAMES if name not in ('repo', 'id_build'))
+        self._upsert = (f"INSERT INTO builds ({columns}) VALUES ({placeholders}) "
+                        f"ON CONFLICT(repo, id_build) DO UPDATE SET {updates}")
+
+    def _create_schema(self):
+        columns = ', '.join(f"{name} {column_type(name)}" for name in FIELDNAMES)
+        with self._connection:
+            self._connection.execute(
+                f"CREATE TABLE IF NOT EXISTS builds ({columns}, PRIMARY KEY (repo, id_build))")
+            existing = {row[1] for row in self._connection.execute('PRAGMA table_info(builds)')}
+            for name in FIELDNAMES:
+                if name not in existing:  # Database created before the column was added
+                    self._connection.execute(f"ALTER TABLE builds ADD COLUMN {name} {column_type(name)}")
+            for name in INDEXED_COLUMNS:
+                self._connection.execute(f"CREATE INDEX IF NOT EXISTS idx_builds_{name} ON builds ({name})")
+
+    def existing_ids(self, repo):
+        with self._lock:
+            rows = self._connection.execute('SELECT id_build FROM builds WHERE repo = ?', (repo,))
+            return {str(build_id) for build_id, in rows}  # IDs are strings for consistency
+
+    def write(self, builds, on_written=None):
+        """Buffer builds; on_written is called once they are committed."""
+        with self._lock:
+            for position, build in enumerate(builds):
+                callback = on_written if position == len(builds) - 1 else None
+                self._buffer.append(([to_sql_value(name, build.get(name)) for name in FIELDNAMES], callback))
+            if len(self._buffer) >= self.batch_size:
+                self._flush()
+        if on_written is not None and not builds:
+            on_written()
+
+    def _flush(self):
+        entries, self._buffer = self._buffer, []
+        if not entries:
+            return
+        with self._connection:  # One transaction per batch, rolled back on error
+            self._connection.executemany(self._upsert, [values for values, _ in entries])
+        logging.info(f"✅ {len(entries)} build(s) upserted into {self.db_path}.")
+        for _, callback in entries:
+            if callback is not None:
+                callback()
+
+    def flush(self):
+        with self._lock:
+            self._flush()
+
+    def close(self):
+        self.flush()
+        with self._lock:
+            self._connection.close()